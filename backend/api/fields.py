@@ -0,0 +1,151 @@
+import binascii
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db.models.fields.files import FieldFile
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import Field, ImageField
+
+BASE64_CHUNK_SIZE = 64 * 1024
+BASE64_WHITESPACE = str.maketrans("", "", " \t\r\n")
+
+
+class StreamingBase64ImageField(ImageField):
+    """Изображение в base64. Строка декодируется частями во временный
+       файл, формат и размеры проверяются по заголовку до декодирования
+       пикселей, так что в памяти не держится ни копия файла, ни
+       картинка целиком."""
+
+    ALLOWED_FORMATS = {
+        "JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp",
+    }
+    default_error_messages = {
+        "invalid_base64": "Некорректная строка base64.",
+        "invalid_format": "Допустимые форматы: JPEG, PNG, GIF, WEBP.",
+        "too_large": "Размер файла превышает {max_bytes} байт.",
+        "too_many_pixels": "Изображение больше {max_pixels} пикселей.",
+    }
+
+    def to_internal_value(self, data: str) -> TemporaryUploadedFile:
+        if not isinstance(data, str):
+            return super().to_internal_value(data)
+
+        start = data.find(";base64,")
+        start = 0 if start == -1 else start + len(";base64,")
+
+        if (len(data) - start) * 3 // 4 > settings.RECIPE_IMAGE_MAX_BYTES:
+            self.fail("too_large", max_bytes=settings.RECIPE_IMAGE_MAX_BYTES)
+
+        upload = TemporaryUploadedFile(
+            f"{uuid4()}", "application/octet-stream", 0, None)
+        try:
+            upload.size = self.decode_to_file(data, start, upload)
+            image_format = self.check_header(upload)
+        except ValidationError:
+            upload.close()
+            raise
+
+        upload.name = f"{upload.name}.{self.ALLOWED_FORMATS[image_format]}"
+        upload.content_type = Image.MIME[image_format]
+        return super().to_internal_value(upload)
+
+    def decode_to_file(
+        self, data: str, start: int, upload: TemporaryUploadedFile
+    ) -> int:
+        """Пишет декодированные данные в файл, возвращает их размер."""
+        size, tail = 0, ""
+
+        for offset in range(start, len(data), BASE64_CHUNK_SIZE):
+            chunk = tail + data[
+                offset:offset + BASE64_CHUNK_SIZE
+            ].translate(BASE64_WHITESPACE)
+            usable = len(chunk) - len(chunk) % 4
+            chunk, tail = chunk[:usable], chunk[usable:]
+
+            try:
+                decoded = binascii.a2b_base64(chunk)
+            except binascii.Error:
+                self.fail("invalid_base64")
+
+            upload.write(decoded)
+            size += len(decoded)
+
+        if tail.rstrip("="):
+            self.fail("invalid_base64")
+
+        upload.flush()
+        upload.seek(0)
+        return size
+
+    def check_header(self, upload: TemporaryUploadedFile) -> str:
+        """Проверяет формат и размеры, читая только заголовок файла."""
+        try:
+            with Image.open(upload.temporary_file_path()) as image:
+                image_format, (width, height) = image.format, image.size
+        except Image.DecompressionBombError:
+            width = height = settings.RECIPE_IMAGE_MAX_PIXELS
+            image_format = None
+        except OSError:
+            self.fail("invalid_format")
+
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            self.fail(
+                "too_many_pixels",
+                max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS,
+            )
+        if image_format not in self.ALLOWED_FORMATS:
+            self.fail("invalid_format")
+        return image_format
+
+
+class RenditionMixin:
+    """Выбирает для вывода уменьшенный вариант изображения рецепта,
+       если он уже построен, иначе оригинал."""
+
+    def __init__(self, *args, rendition: str = "full", **kwargs) -> None:
+        self.rendition = rendition
+        super().__init__(*args, **kwargs)
+
+    def build_url(self, name: str) -> str:
+        url = default_storage.url(name)
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+    def get_sources(self, value: FieldFile) -> dict[str, str]:
+        renditions = value.instance.image_renditions or {}
+        return renditions.get(self.rendition, {})
+
+
+class RecipeImageField(RenditionMixin, StreamingBase64ImageField):
+    """Изображение рецепта: принимает base64, отдаёт ссылку на JPEG
+       нужного варианта."""
+
+    def to_representation(self, value: FieldFile) -> str | None:
+        if not value:
+            return None
+
+        name = self.get_sources(value).get("jpeg")
+        if name is None:
+            return super().to_representation(value)
+        return self.build_url(name)
+
+
+class ImageSourcesField(RenditionMixin, Field):
+    """Ссылки на вариант изображения во всех построенных форматах."""
+
+    def __init__(self, **kwargs) -> None:
+        kwargs.setdefault("source", "image")
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value: FieldFile) -> dict[str, str]:
+        if not value:
+            return {}
+
+        return {
+            image_format: self.build_url(name)
+            for image_format, name in self.get_sources(value).items()
+        }
@@ -1,37 +1,74 @@
+from django.db.models import Exists, OuterRef, QuerySet
 from django_filters import rest_framework as filters
 
-from core.services import maybe_incorrect_layout
-from recipes.models import Ingredient, Recipe
+from core.search import get_ingredient_search, get_recipe_search
+from recipes.models import Carts, Favorites, Ingredient, Recipe, RecipeTag
 
 
 class RecipeFilterSet(filters.FilterSet):
+    """Фильтры рецептов. Теги, избранное и корзина проверяются
+       подзапросами EXISTS, без JOIN и DISTINCT. Для анонимного
+       пользователя избранное и корзина пусты: `=1` ничего не находит,
+       `=0` не ограничивает выборку. `search` ищет по названию и
+       описанию и упорядочивает по релевантности. `ordering=popular`
+       сортирует по числу добавлений в избранное; при курсорной
+       пагинации порядок задаёт пагинатор."""
     author = filters.NumberFilter(field_name='author')
-    tags = filters.MultipleChoiceFilter(
-        field_name='tags__slug', conjoined=False)
+    tags = filters.CharFilter(method='filter_tags')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'popular'),), method='filter_ordering')
 
     class Meta:
         model = Recipe
         fields = ('author', 'tags', 'is_in_shopping_cart', 'is_favorited')
 
-    def filter_is_in_shopping_cart(self, queryset, name, value):
-        if value:
-            queryset = queryset.filter(in_carts__user=self.request.user)
-        else:
-            queryset = queryset.exclude(in_carts__user=self.request.user)
+    def filter_tags(self, queryset, name, value):
+        slugs = [slug for slug in self.data.getlist(name) if slug]
 
-        return queryset
+        if not slugs:
+            return queryset
 
-    def filter_is_favorited(self, queryset, name, value):
-        if value:
-            queryset = queryset.filter(in_favorites__user=self.request.user)
-        else:
-            queryset = queryset.exclude(in_favorites__user=self.request.user)
+        return queryset.filter(
+            Exists(
+                RecipeTag.objects.filter(
+                    recipe=OuterRef("pk"), tag__slug__in=slugs)
+            )
+        )
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        return get_recipe_search().search(queryset, value)
 
+    def filter_ordering(self, queryset, name, value):
+        if value == 'popular':
+            return queryset.order_by('-favorites_count', '-pub_date', '-id')
         return queryset
 
+    def _filter_user_relation(
+        self, queryset: QuerySet, link_model, value: bool
+    ) -> QuerySet:
+        user = self.request.user
+
+        if user.is_anonymous:
+            return queryset.none() if value else queryset
+
+        relation = Exists(
+            link_model.objects.filter(user=user, recipe=OuterRef("pk"))
+        )
+        return queryset.filter(relation if value else ~relation)
+
+    def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self._filter_user_relation(queryset, Carts, value)
+
+    def filter_is_favorited(self, queryset, name, value):
+        return self._filter_user_relation(queryset, Favorites, value)
+
 
 class IngredientFilter(filters.FilterSet):
     name = filters.CharFilter(method="filter_name")
@@ -42,6 +79,5 @@ class IngredientFilter(filters.FilterSet):
 
     def filter_name(self, queryset, name, value):
         if value:
-            value = maybe_incorrect_layout(value)
-            queryset = queryset.filter(name__istartswith=value)
+            queryset = get_ingredient_search().search(queryset, value)
         return queryset
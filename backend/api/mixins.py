@@ -1,14 +1,24 @@
 from typing import Optional, Type
 
+from django.contrib.auth import get_user_model
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Model, Q
+from django.db.models import Model, Q, QuerySet
+from django.db.transaction import atomic
 from django.db.utils import IntegrityError
 from django.shortcuts import get_object_or_404
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.serializers import ModelSerializer
 from rest_framework.status import (HTTP_201_CREATED, HTTP_204_NO_CONTENT,
                                    HTTP_400_BAD_REQUEST)
 
+from api.serializers import BulkRelationSerializer
+from core.cache import invalidate_feeds
+from core.counters import change_relation_counters, count_relation
+from core.relations import get_relations
+
+User = get_user_model()
+
 
 class AddDelViewMixin:
     """Добавляет во Viewset дополнительные методы. Содержит методы
@@ -17,11 +27,15 @@ class AddDelViewMixin:
     add_serializer: Optional[Type[ModelSerializer]] = None
     link_model: Optional[Type[Model]] = None
 
+    def get_add_queryset(self) -> QuerySet:
+        """Выборка объектов, с которыми создаётся связь."""
+        return self.queryset
+
     def _create_relation(self,
                          obj_id: int | str,
                          relation_type: str) -> Response:
         """Добавляет связь M2M между объектами."""
-        obj = get_object_or_404(self.queryset, pk=obj_id)
+        obj = get_object_or_404(self.get_add_queryset(), pk=obj_id)
 
         if relation_type == 'subscription':
             fields = {'author_id': obj.pk, 'user_id': self.request.user.pk}
@@ -29,27 +43,123 @@ class AddDelViewMixin:
             fields = {'recipe_id': obj.pk, 'user_id': self.request.user.pk}
 
         try:
-            self.link_model.objects.create(**fields)
+            with atomic():
+                self._lock_user()
+                relation = self.link_model.objects.create(**fields)
+                count_relation(relation, 1)
+                self._relation_created(relation)
         except IntegrityError:
             return Response(
                 {"error": "Действие уже выполнено."},
                 status=HTTP_400_BAD_REQUEST,
             )
 
-        serializer: ModelSerializer = self.add_serializer(obj)
+        invalidate_feeds([self.request.user.pk])
+        get_relations(self.request).remember_relation(relation, True)
+        serializer: ModelSerializer = self.add_serializer(
+            obj, context=self.get_serializer_context())
         return Response(serializer.data, status=HTTP_201_CREATED)
 
     def _delete_relation(self, q: Q) -> Response:
         """Удаляет связь M2M между объектами."""
-        try:
-            relation = self.link_model.objects.get(
-                q & Q(user=self.request.user)
-            )
-        except ObjectDoesNotExist:
-            return Response(
-                {"error": f"{self.link_model.__name__} не существует"},
-                status=HTTP_400_BAD_REQUEST,
-            )
+        with atomic():
+            self._lock_user()
+            try:
+                relation = self.link_model.objects.get(
+                    q & Q(user=self.request.user)
+                )
+            except ObjectDoesNotExist:
+                return Response(
+                    {"error": f"{self.link_model.__name__} не существует"},
+                    status=HTTP_400_BAD_REQUEST,
+                )
+
+            self._relation_deleted(relation)
+            count_relation(relation, -1)
+            relation.delete()
 
-        relation.delete()
+        invalidate_feeds([self.request.user.pk])
+        get_relations(self.request).remember_relation(relation, False)
         return Response(status=HTTP_204_NO_CONTENT)
+
+    def _bulk_relation(self, request: Request, relation_type: str) -> Response:
+        """Добавляет или удаляет связи со списком объектов одной
+           транзакцией. Для каждого идентификатора возвращает статус:
+           created, exists, deleted, missing, not_found или invalid."""
+        serializer = BulkRelationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["ids"]
+
+        field = "author" if relation_type == "subscription" else "recipe"
+        user = request.user
+        invalid = {user.pk} if relation_type == "subscription" else set()
+
+        with atomic():
+            self._lock_user()
+            found = set(
+                self.queryset.filter(pk__in=ids).values_list("pk", flat=True)
+            ) - invalid
+            relations = self.link_model.objects.filter(
+                user=user, **{f"{field}_id__in": found}
+            )
+            existing = set(
+                relations.values_list(f"{field}_id", flat=True))
+
+            if request.method == "DELETE":
+                changed = existing
+                if changed:
+                    self._relations_deleted(sorted(changed))
+                    change_relation_counters(self.link_model, changed, -1)
+                    relations.delete()
+                statuses = ("deleted", "missing")
+            else:
+                changed = found - existing
+                self.link_model.objects.bulk_create(
+                    (
+                        self.link_model(user=user, **{f"{field}_id": pk})
+                        for pk in sorted(changed)
+                    ),
+                    ignore_conflicts=True,
+                )
+                if changed:
+                    change_relation_counters(self.link_model, changed, 1)
+                    self._relations_created(sorted(changed))
+                statuses = ("created", "exists")
+
+        if changed:
+            invalidate_feeds([user.pk])
+        get_relations(request).remember(
+            self.link_model, found, request.method != "DELETE")
+
+        results = []
+        for pk in ids:
+            if pk in invalid:
+                status = "invalid"
+            elif pk not in found:
+                status = "not_found"
+            else:
+                status = statuses[pk not in changed]
+            results.append({"id": pk, "status": status})
+
+        return Response({"results": results})
+
+    def _lock_user(self) -> None:
+        """Блокирует строку текущего пользователя до конца транзакции,
+           чтобы параллельные запросы не меняли его связи одновременно."""
+        list(
+            User.objects.select_for_update()
+            .filter(pk=self.request.user.pk)
+            .values_list("pk", flat=True)
+        )
+
+    def _relation_created(self, relation: Model) -> None:
+        """Вызывается после создания связи в той же транзакции."""
+
+    def _relation_deleted(self, relation: Model) -> None:
+        """Вызывается перед удалением связи в той же транзакции."""
+
+    def _relations_created(self, obj_ids: list[int]) -> None:
+        """Вызывается после пакетного создания связей с объектами."""
+
+    def _relations_deleted(self, obj_ids: list[int]) -> None:
+        """Вызывается перед пакетным удалением связей с объектами."""
@@ -1,7 +1,143 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CachedCountPaginator(DjangoPaginator):
+    """Пагинатор, запоминающий результат COUNT(*) на
+       PAGINATION_COUNT_CACHE_TIMEOUT секунд."""
+
+    @cached_property
+    def count(self) -> int:
+        timeout = settings.PAGINATION_COUNT_CACHE_TIMEOUT
+        if not timeout or not isinstance(self.object_list, QuerySet):
+            return super().count
+
+        query = str(self.object_list.query).encode()
+        key = f"pagination_count:{md5(query).hexdigest()}"
+        count = cache.get(key)
+
+        if count is None:
+            count = super().count
+            cache.set(key, count, timeout)
+        return count
 
 
 class PageLimitPagination(PageNumberPagination):
     """Стандартный пагинатор с определением атрибута."""
 
     page_size_query_param = "limit"
+    django_paginator_class = CachedCountPaginator
+
+
+class KeysetPagination(BasePagination):
+    """Курсорная пагинация по (pub_date, id) от новых к старым.
+       Страница выбирается условием по индексу вместо OFFSET и не
+       требует подсчёта всех строк."""
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "limit"
+    page_size = 6
+    max_page_size = 100
+    ordering = ("-pub_date", "-id")
+
+    @classmethod
+    def is_requested(cls, request: Request) -> bool:
+        return (
+            cls.cursor_query_param in request.query_params
+            or request.query_params.get("pagination") == "cursor"
+        )
+
+    def get_page_size(self, request: Request) -> int:
+        page_size = request.query_params.get(self.page_size_query_param)
+
+        if page_size and page_size.isdigit() and int(page_size):
+            return min(int(page_size), self.max_page_size)
+        return self.page_size
+
+    @staticmethod
+    def encode_cursor(pub_date: datetime, pk: int) -> str:
+        value = f"{pub_date.isoformat()}|{pk}".encode()
+        return urlsafe_b64encode(value).decode()
+
+    def decode_cursor(self, cursor: str) -> tuple[datetime, int] | None:
+        if not cursor:
+            return None
+
+        try:
+            pub_date, pk = urlsafe_b64decode(
+                cursor.encode()).decode().split("|")
+            return datetime.fromisoformat(pub_date), int(pk)
+        except (BinasciiError, UnicodeDecodeError, ValueError):
+            raise NotFound("Некорректный курсор.")
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request: Request, view=None
+    ) -> list:
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param, ""))
+        queryset = queryset.order_by(*self.ordering)
+
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+            )
+
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_next_link(self) -> str | None:
+        if not self.has_next:
+            return None
+
+        url = remove_query_param(
+            self.request.build_absolute_uri(), "pagination")
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.encode_cursor(self.last.pub_date, self.last.pk),
+        )
+
+    def get_paginated_response(self, data: list) -> Response:
+        return Response(
+            {"next": self.get_next_link(), "previous": None, "results": data}
+        )
+
+
+class RecipePagination(PageLimitPagination):
+    """Постраничная пагинация рецептов. С параметром `cursor` или
+       `pagination=cursor` переключается на курсорную."""
+
+    def paginate_queryset(
+        self, queryset: QuerySet, request: Request, view=None
+    ) -> list | None:
+        self.keyset = None
+
+        if KeysetPagination.is_requested(request):
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data: list) -> Response:
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
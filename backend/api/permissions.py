@@ -47,7 +47,7 @@ class AdminOrReadOnly(BlockPermission):
        Остальным только чтение."""
 
     def has_object_permission(
-        self, request: WSGIRequest, view: APIRootView
+        self, request: WSGIRequest, view: APIRootView, obj: Model
     ) -> bool:
 
         return (
@@ -1,14 +1,23 @@
 from collections import OrderedDict
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from django.db.models import F, QuerySet
+from django.db.models import F, Manager, QuerySet, Value
 from django.db.transaction import atomic
-from drf_extra_fields.fields import Base64ImageField
-from rest_framework.serializers import ModelSerializer, SerializerMethodField
-
-from core.services import recipe_ingredients_set
-from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.serializers import (FloatField, IntegerField, ListField,
+                                        ListSerializer, ModelSerializer,
+                                        ReadOnlyField, Serializer,
+                                        SerializerMethodField)
+
+from api.fields import ImageSourcesField, RecipeImageField
+from core.catalog import get_catalog
+from core.relations import RelationContext, get_relations
+from core.services import (recipe_ingredients_set,
+                           recipe_ingredients_update, recipe_tags_update)
+from recipes.models import (Carts, Favorites, Ingredient, Recipe, RecipeTag,
+                            ShoppingListItem, Tag)
+from users.models import Subscriptions
 
 User = get_user_model()
 
@@ -17,13 +26,48 @@ class RecipeSummarySerializer(ModelSerializer):
     """Для предоставления краткой информации о рецепте, включая
        его идентификатор, название, изображение и время приготовления."""
 
+    image = RecipeImageField(rendition="thumbnail", read_only=True)
+    image_sources = ImageSourcesField(rendition="thumbnail")
+
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "image_sources", "cooking_time")
         read_only_fields = ("__all__",)
 
 
-class UserSerializer(ModelSerializer):
+class BulkRelationSerializer(Serializer):
+    """Список идентификаторов для пакетного добавления или удаления
+       связей. Повторы отбрасываются с сохранением порядка."""
+
+    ids = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RELATIONS_MAX,
+    )
+
+    def validate_ids(self, ids: list[int]) -> list[int]:
+        return list(dict.fromkeys(ids))
+
+
+class RelationListSerializer(ListSerializer):
+    """Перед выводом списка загружает связи текущего пользователя сразу
+       для всех объектов страницы."""
+
+    def to_representation(self, data) -> list:
+        items = list(data.all() if isinstance(data, Manager) else data)
+        self.child.load_relations(items)
+        return super().to_representation(items)
+
+
+class RelationsMixin:
+    """Доступ сериализатора к связям текущего пользователя."""
+
+    @property
+    def relations(self) -> RelationContext:
+        return get_relations(self.context.get("request"))
+
+
+class UserSerializer(RelationsMixin, ModelSerializer):
     """Для работы с данными пользователей, генерации и обработки
        пользовательской информации."""
 
@@ -44,15 +88,21 @@ class UserSerializer(ModelSerializer):
             "password": {"write_only": True},
             "is_subscribed": {"read_only": True},
         }
+        list_serializer_class = RelationListSerializer
+
+    def load_relations(self, users: list[User]) -> None:
+        relations = self.relations
+        relations.load(
+            Subscriptions,
+            (user.pk for user in users if user.pk != relations.user_id),
+        )
 
     def get_is_subscribed(self, obj: User) -> bool:
         """Проверка подписки пользователей."""
-        user = self.context.get("request").user
-
-        if user.is_anonymous or (user == obj):
+        if obj.pk == self.relations.user_id:
             return False
 
-        return user.subscriptions.filter(author=obj).exists()
+        return self.relations.contains(Subscriptions, obj.pk)
 
     def create(self, validated_data: dict) -> User:
         """Создаёт нового пользователя с запрошенными полями."""
@@ -71,7 +121,7 @@ class UserSubscribeSerializer(UserSerializer):
     """Сериализатор вывода авторов на которых подписан текущий пользователь."""
 
     recipes = RecipeSummarySerializer(many=True, read_only=True)
-    recipes_count = SerializerMethodField()
+    recipes_count = IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -86,14 +136,7 @@ class UserSubscribeSerializer(UserSerializer):
             "recipes_count",
         )
         read_only_fields = ("__all__",)
-
-    def get_is_subscribed(*args) -> bool:
-        """Проверка подписки."""
-        return True
-
-    def get_recipes_count(self, obj: User) -> int:
-        """Показывает общее количество рецептов у каждого автора."""
-        return obj.recipes.count()
+        list_serializer_class = RelationListSerializer
 
 
 class TagSerializer(ModelSerializer):
@@ -120,7 +163,20 @@ class IngredientSerializer(ModelSerializer):
         read_only_fields = ("all",)
 
 
-class RecipeSerializer(ModelSerializer):
+class ShoppingListItemSerializer(ModelSerializer):
+    """Позиция сводного списка покупок."""
+
+    id = ReadOnlyField(source="ingredient.id")
+    name = ReadOnlyField(source="ingredient.name")
+    measurement_unit = ReadOnlyField(source="ingredient.measurement_unit")
+    amount = IntegerField(source="total_amount", read_only=True)
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ("id", "name", "measurement_unit", "amount")
+
+
+class RecipeSerializer(RelationsMixin, ModelSerializer):
     """Сериализатор для рецептов."""
 
     tags = TagSerializer(many=True, read_only=True)
@@ -128,7 +184,8 @@ class RecipeSerializer(ModelSerializer):
     ingredients = SerializerMethodField()
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
-    image = Base64ImageField()
+    image = RecipeImageField(rendition="full")
+    image_sources = ImageSourcesField(rendition="full")
 
     class Meta:
         model = Recipe
@@ -141,6 +198,7 @@ class RecipeSerializer(ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_sources",
             "text",
             "cooking_time",
         )
@@ -148,9 +206,51 @@ class RecipeSerializer(ModelSerializer):
             "is_favorite",
             "is_shopping_cart",
         )
+        list_serializer_class = RelationListSerializer
+
+    def load_relations(self, recipes: list[Recipe]) -> None:
+        """Берёт флаги из аннотаций выборки, если они есть, остальные
+           загружает для всех рецептов сразу."""
+        relations = self.relations
+        pending = []
+
+        for recipe in recipes:
+            if getattr(recipe, "is_favorited", None) is None:
+                pending.append(recipe)
+                continue
+
+            relations.assume(Favorites, recipe.pk, recipe.is_favorited)
+            relations.assume(Carts, recipe.pk, recipe.is_in_shopping_cart)
+            relations.assume(
+                Subscriptions, recipe.author_id, recipe.author_is_subscribed)
+
+        relations.load(Favorites, (recipe.pk for recipe in pending))
+        relations.load(Carts, (recipe.pk for recipe in pending))
+        relations.load(
+            Subscriptions,
+            (
+                recipe.author_id for recipe in pending
+                if recipe.author_id != relations.user_id
+            ),
+        )
 
-    def get_ingredients(self, recipe: Recipe) -> QuerySet[dict]:
+    def to_representation(self, recipe: Recipe) -> OrderedDict:
+        self.load_relations([recipe])
+        return super().to_representation(recipe)
+
+    def get_ingredients(self, recipe: Recipe) -> list[dict] | QuerySet[dict]:
         """Получает список ингридиентов для рецепта."""
+        if "ingredient" in getattr(recipe, "_prefetched_objects_cache", {}):
+            return [
+                {
+                    "id": item.ingredients.id,
+                    "name": item.ingredients.name,
+                    "measurement_unit": item.ingredients.measurement_unit,
+                    "amount": item.amount,
+                }
+                for item in recipe.ingredient.all()
+            ]
+
         ingredients = recipe.ingredients.values(
             "id", "name", "measurement_unit", amount=F("recipe__amount")
         )
@@ -158,66 +258,83 @@ class RecipeSerializer(ModelSerializer):
 
     def get_is_favorited(self, recipe: Recipe) -> bool:
         """Есть ли рецепт в избранном."""
-        user = self.context.get("view").request.user
-
-        if user.is_anonymous:
-            return False
-
-        return user.favorites.filter(recipe=recipe).exists()
+        return self.relations.contains(Favorites, recipe.pk)
 
     def get_is_in_shopping_cart(self, recipe: Recipe) -> bool:
         """Есть ли рецепт в списке покупок."""
-        user = self.context.get("view").request.user
+        return self.relations.contains(Carts, recipe.pk)
 
-        if user.is_anonymous:
-            return False
+    @staticmethod
+    def parse_id(value) -> int:
+        """Приводит идентификатор из запроса к целому числу."""
+        if isinstance(value, bool) or not str(value).isdigit():
+            raise ValidationError("Некорректный идентификатор.")
+        return int(value)
 
-        return user.carts.filter(recipe=recipe).exists()
-
-    def validate_tags(self, tags_ids: list):
+    def validate_tags(self, tags_ids: list) -> list[int]:
         """ Валидация списка идентификаторов тегов."""
-        if not tags_ids:
+        if not tags_ids or not isinstance(tags_ids, list):
             raise ValidationError("Теги обязательны для создания рецепта.")
 
-        tags = Tag.objects.filter(id__in=tags_ids)
-
-        if len(tags) != len(tags_ids):
-            raise ValidationError("Указан несуществующий тег.")
+        return list(dict.fromkeys(self.parse_id(pk) for pk in tags_ids))
 
-        return list(tags)
-
-    def validate_ingredients(self, ingredients: list):
+    def validate_ingredients(self, ingredients: list) -> dict[int, int]:
         """Валидация списка ингредиентов."""
-        if not ingredients:
+        if not ingredients or not isinstance(ingredients, list):
             raise ValidationError(
                 "Ингредиенты обязательны для создания рецепта.")
 
         valid_ings = {}
 
         for ing in ingredients:
+            if not isinstance(ing, dict):
+                raise ValidationError("Некорректные ингредиенты")
+
             amount = ing.get("amount")
 
             if not (isinstance(amount, int) or str(amount).isdigit()):
                 raise ValidationError("Некорректное количество ингредиента")
 
-            ing_id = ing["id"]
+            ing_id = self.parse_id(ing.get("id"))
             amount = int(amount)
 
             if amount <= 0:
                 raise ValidationError("Некорректное количество ингредиента")
             valid_ings[ing_id] = amount
 
-        if not valid_ings:
-            raise ValidationError("Некорректные ингредиенты")
-
-        db_ings = Ingredient.objects.filter(pk__in=valid_ings.keys())
+        return valid_ings
+
+    @staticmethod
+    def check_existence(
+        tags_ids: list[int], ingredient_ids: list[int]
+    ) -> None:
+        """Проверяет, что теги и ингредиенты существуют. Ингредиенты
+           сверяются с каталогом в памяти, если он включён, иначе теги и
+           ингредиенты проверяются одним запросом."""
+        tags = Tag.objects.filter(id__in=tags_ids).order_by()
+
+        if settings.INGREDIENT_CATALOG_IN_MEMORY:
+            catalog = get_catalog()
+            found = {("tag", pk) for pk in tags.values_list("id", flat=True)}
+            found.update(
+                ("ingredient", pk) for pk in ingredient_ids if pk in catalog
+            )
+        else:
+            found = set(
+                tags.values_list(Value("tag"), "id").union(
+                    Ingredient.objects.filter(pk__in=ingredient_ids)
+                    .order_by()
+                    .values_list(Value("ingredient"), "id"),
+                    all=True,
+                )
+            )
+
+        if any(("tag", pk) not in found for pk in tags_ids):
+            raise ValidationError("Указан несуществующий тег.")
 
-        if not db_ings:
+        if any(("ingredient", pk) not in found for pk in ingredient_ids):
             raise ValidationError("Некорректные ингредиенты")
 
-        result = {ing.pk: (ing, valid_ings[ing.pk]) for ing in db_ings}
-        return result
-
     def validate(self, data: OrderedDict) -> OrderedDict:
         """Валидация исходных данных."""
         tags_ids: list[int] = self.initial_data.get("tags")
@@ -225,6 +342,7 @@ class RecipeSerializer(ModelSerializer):
 
         tags = self.validate_tags(tags_ids)
         ingredients = self.validate_ingredients(ingredients)
+        self.check_existence(tags, list(ingredients))
 
         data.update(
             {
@@ -235,33 +353,67 @@ class RecipeSerializer(ModelSerializer):
         )
         return data
 
+    def save(self, **kwargs) -> Recipe:
+        """Сохраняет рецепт и закрывает временный файл изображения."""
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get("image")
+            if image is not None:
+                image.close()
+
     @atomic
     def create(self, validated_data: dict) -> Recipe:
         """Создаёт рецепт."""
         tags: list[int] = validated_data.pop("tags")
-        ingredients: dict[int, tuple] = validated_data.pop("ingredients")
+        ingredients: dict[int, int] = validated_data.pop("ingredients")
         recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=pk) for pk in tags
+        )
         recipe_ingredients_set(recipe, ingredients)
+        # Новый рецепт ещё никто не добавил в избранное и корзину.
+        self.relations.remember(Favorites, (recipe.pk,), False)
+        self.relations.remember(Carts, (recipe.pk,), False)
         return recipe
 
     @atomic
     def update(self, recipe: Recipe, validated_data: dict):
-        """Обновляет рецепт."""
+        """Обновляет рецепт. Теги и ингредиенты сравниваются с текущими,
+           записываются только отличия. Если поля самого рецепта не
+           менялись, он не сохраняется повторно."""
         tags = validated_data.pop("tags")
         ingredients = validated_data.pop("ingredients")
+        validated_data.pop("author", None)
+        changed = []
 
         for key, value in validated_data.items():
-            if hasattr(recipe, key):
+            if hasattr(recipe, key) and getattr(recipe, key) != value:
                 setattr(recipe, key, value)
+                changed.append(key)
 
         if tags:
-            recipe.tags.clear()
-            recipe.tags.set(tags)
+            recipe_tags_update(recipe, tags)
 
         if ingredients:
-            recipe.ingredients.clear()
-            recipe_ingredients_set(recipe, ingredients)
+            old_amounts, new_amounts = recipe_ingredients_update(
+                recipe, ingredients)
 
-        recipe.save()
+            if old_amounts != new_amounts:
+                ShoppingListItem.objects.change_recipe(
+                    recipe, old_amounts, new_amounts)
+
+        if changed:
+            recipe.save(update_fields=changed)
         return recipe
+
+
+class PantryRecipeSerializer(RecipeSerializer):
+    """Рецепт в поиске по имеющимся ингредиентам: доля имеющихся
+       ингредиентов и число недостающих."""
+
+    coverage = FloatField(read_only=True)
+    missing = IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ("coverage", "missing")
@@ -0,0 +1,401 @@
+import os
+import shutil
+import tempfile
+import tracemalloc
+from base64 import b64decode, b64encode
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import ImageField
+from rest_framework.test import APIClient, APIRequestFactory
+
+from api.fields import StreamingBase64ImageField
+from api.filters import RecipeFilterSet
+from core import pantry
+from recipes.models import (AmountIngredient, Carts, Favorites, Ingredient,
+                            Recipe, RecipeTag, Tag)
+from users.models import NewUser
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_bytes(size: tuple[int, int] = (2, 2), image_format="PNG") -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", size, "red").save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def data_uri(content: bytes, mime: str = "image/png") -> str:
+    return f"data:{mime};base64,{b64encode(content).decode()}"
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, INGREDIENT_CATALOG_IN_MEMORY=False)
+class RecipesTestCase(TestCase):
+    """Пользователи, теги, ингредиенты и фабрика рецептов для тестов
+       API рецептов."""
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.author = cls.create_user("author")
+        cls.user = cls.create_user("reader")
+        cls.tags = Tag.objects.bulk_create(
+            Tag(name=f"Тег {i}", color=f"#00000{i}", slug=f"tag{i}")
+            for i in range(4)
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"Ингредиент {i}", measurement_unit="г")
+            for i in range(10)
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def create_user(username: str) -> NewUser:
+        return NewUser.objects.create_user(
+            username=username, email=f"{username}@example.com",
+            password="password", first_name=username, last_name=username,
+        )
+
+    def create_recipes(
+        self, count: int, tags: list[Tag] | None = None,
+        ingredients: int = 3,
+    ) -> list[Recipe]:
+        tags = self.tags[:2] if tags is None else tags
+        recipes = []
+        start = Recipe.objects.count()
+
+        for i in range(start, start + count):
+            recipe = Recipe.objects.create(
+                author=self.author, name=f"Рецепт {i}", text="Описание",
+                cooking_time=10,
+                image=SimpleUploadedFile("recipe.png", image_bytes()),
+            )
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag=tag) for tag in tags)
+            AmountIngredient.objects.bulk_create(
+                AmountIngredient(
+                    recipe=recipe, ingredients=ingredient, amount=k + 1)
+                for k, ingredient in enumerate(
+                    self.ingredients[:ingredients])
+            )
+            recipes.append(recipe)
+        return recipes
+
+    def count_queries(self, url: str) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+
+class RecipesListQueriesTest(RecipesTestCase):
+    """Число запросов страницы рецептов не зависит от её размера."""
+
+    def test_page_queries_do_not_depend_on_page_size(self) -> None:
+        self.create_recipes(8)
+
+        small = self.count_queries("/api/recipes/?limit=2")
+        large = self.count_queries("/api/recipes/?limit=8")
+
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 6)
+
+
+class RecipeFiltersQueriesTest(RecipesTestCase):
+    """Фильтры избранного, корзины и тегов проверяются подзапросами
+       EXISTS без JOIN: результат верен и для отрицания, а число
+       запросов не растёт с числом связей."""
+
+    def add_relations(self, link_model, recipes: list[Recipe]) -> None:
+        link_model.objects.bulk_create(
+            link_model(user=self.user, recipe=recipe) for recipe in recipes)
+
+    def assert_filter_does_not_scale(self, link_model, url: str) -> None:
+        recipes = self.create_recipes(8)
+        self.add_relations(link_model, recipes[:2])
+        few = self.count_queries(url)
+
+        self.add_relations(link_model, recipes[2:])
+        many = self.count_queries(url)
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(self.client.get(url).data["results"]), 8)
+
+    def test_is_favorited(self) -> None:
+        self.assert_filter_does_not_scale(
+            Favorites, "/api/recipes/?is_favorited=1&limit=10")
+
+    def test_is_in_shopping_cart(self) -> None:
+        self.assert_filter_does_not_scale(
+            Carts, "/api/recipes/?is_in_shopping_cart=1&limit=10")
+
+    def test_tags(self) -> None:
+        url = "/api/recipes/?tags=tag0&tags=tag1&limit=10"
+        self.create_recipes(2, tags=self.tags[:1])
+        few = self.count_queries(url)
+
+        self.create_recipes(6, tags=self.tags[:2])
+        many = self.count_queries(url)
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(self.client.get(url).data["results"]), 8)
+
+    def filter_sql(self, **params) -> str:
+        request = APIRequestFactory().get("/api/recipes/", params)
+        request.user = self.user
+        filterset = RecipeFilterSet(
+            request.GET, queryset=Recipe.objects.all(), request=request)
+        return str(filterset.qs.query).upper()
+
+    def test_relations_without_join(self) -> None:
+        for param, table in (
+            ("is_favorited", "RECIPES_FAVORITES"),
+            ("is_in_shopping_cart", "RECIPES_CARTS"),
+            ("tags", "RECIPES_RECIPE_TAGS"),
+        ):
+            for value in ("1", "0") if param != "tags" else ("tag0",):
+                with self.subTest(param=param, value=value):
+                    outer, _, subquery = self.filter_sql(
+                        **{param: value}).partition("EXISTS")
+                    # Связи проверяются подзапросом, внешний запрос
+                    # читает только рецепты: без JOIN и DISTINCT.
+                    self.assertIn(table, subquery)
+                    self.assertNotIn("JOIN", outer)
+                    self.assertNotIn("DISTINCT", outer)
+
+    def test_relations_and_negation(self) -> None:
+        recipes = self.create_recipes(8)
+        all_ids = {recipe.pk for recipe in recipes}
+
+        for link_model, param in (
+            (Favorites, "is_favorited"),
+            (Carts, "is_in_shopping_cart"),
+        ):
+            with self.subTest(param=param):
+                linked = recipes[1:4]
+                self.add_relations(link_model, linked)
+                # Связь другого пользователя не влияет на результат.
+                link_model.objects.create(user=self.author, recipe=recipes[0])
+                linked_ids = {recipe.pk for recipe in linked}
+                url = f"/api/recipes/?limit=10&{param}="
+
+                for value, expected in (
+                    ("1", linked_ids), ("0", all_ids - linked_ids),
+                ):
+                    results = self.client.get(url + value).data["results"]
+                    self.assertEqual(
+                        {recipe["id"] for recipe in results}, expected)
+
+    def test_anonymous_user_relations(self) -> None:
+        self.create_recipes(3)
+        self.client.force_authenticate(None)
+
+        for param in ("is_favorited", "is_in_shopping_cart"):
+            with self.subTest(param=param):
+                url = f"/api/recipes/?limit=10&{param}="
+                self.assertEqual(self.client.get(url + "1").data["count"], 0)
+                self.assertEqual(self.client.get(url + "0").data["count"], 3)
+
+
+class RecipeUpdateWritesTest(RecipesTestCase):
+    """PATCH рецепта записывает только то, что изменилось."""
+
+    WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.recipe = self.create_recipes(1)[0]
+        self.client.force_authenticate(self.author)
+        self.data = {
+            "name": self.recipe.name,
+            "text": self.recipe.text,
+            "cooking_time": self.recipe.cooking_time,
+            "tags": [tag.pk for tag in self.tags[:2]],
+            "ingredients": [
+                {"id": ingredient.pk, "amount": k + 1}
+                for k, ingredient in enumerate(self.ingredients[:3])
+            ],
+        }
+
+    def write_statements(self, **changes) -> list[str]:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f"/api/recipes/{self.recipe.pk}/", {**self.data, **changes},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        return [
+            query["sql"] for query in queries
+            if query["sql"].lstrip().upper().startswith(self.WRITE_STATEMENTS)
+        ]
+
+    def test_unchanged(self) -> None:
+        self.assertEqual(self.write_statements(), [])
+
+    def test_scalar_fields_only(self) -> None:
+        writes = self.write_statements(name="Новое название", cooking_time=20)
+
+        self.assertEqual(len(writes), 1, writes)
+        self.assertIn('UPDATE "recipes_recipe"', writes[0])
+
+    def test_tags_only(self) -> None:
+        writes = self.write_statements(tags=[self.tags[0].pk, self.tags[2].pk])
+
+        # Удаление и добавление одной связи и отметка для пересчёта
+        # похожих рецептов.
+        self.assertEqual(len(writes), 3, writes)
+
+    def test_ingredients_only(self) -> None:
+        ingredients = [dict(item) for item in self.data["ingredients"]]
+        ingredients[0]["amount"] = 100
+
+        writes = self.write_statements(ingredients=ingredients)
+
+        self.assertEqual(len(writes), 1, writes)
+        self.assertIn('UPDATE "recipes_amountingredient"', writes[0])
+
+
+class InMemoryBase64ImageField(ImageField):
+    """Прежнее поле изображения: строка base64 декодируется целиком в
+       память."""
+
+    def to_internal_value(self, data: str) -> ContentFile:
+        _, encoded = data.split(";base64,")
+        return super().to_internal_value(
+            ContentFile(b64decode(encoded), name="image.png"))
+
+
+class StreamingBase64ImageFieldTest(TestCase):
+
+    def assert_fails(self, data: str, code: str) -> None:
+        with self.assertRaises(ValidationError) as context:
+            StreamingBase64ImageField().to_internal_value(data)
+        self.assertEqual(context.exception.get_codes(), [code])
+
+    def test_valid_image(self) -> None:
+        upload = StreamingBase64ImageField().to_internal_value(
+            data_uri(image_bytes(image_format="JPEG"), "image/jpeg"))
+
+        self.assertTrue(upload.name.endswith(".jpg"))
+        self.assertEqual(upload.content_type, "image/jpeg")
+        upload.close()
+
+    def test_invalid_base64(self) -> None:
+        self.assert_fails(
+            "data:image/png;base64,not*base64!", "invalid_base64")
+
+    def test_wrong_magic_bytes(self) -> None:
+        self.assert_fails(data_uri(b"GIF00" + bytes(100)), "invalid_format")
+
+    def test_unsupported_format(self) -> None:
+        self.assert_fails(
+            data_uri(image_bytes(image_format="BMP"), "image/bmp"),
+            "invalid_format",
+        )
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=1000)
+    def test_too_large(self) -> None:
+        self.assert_fails(
+            data_uri(image_bytes((100, 100), "BMP")), "too_large")
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=100 * 100)
+    def test_too_many_pixels(self) -> None:
+        self.assert_fails(data_uri(image_bytes((101, 100))), "too_many_pixels")
+
+    def peak_memory(self, field: ImageField, data: str) -> int:
+        # Первый вызов загружает модули Pillow, они не учитываются.
+        field.to_internal_value(data_uri(image_bytes())).close()
+        tracemalloc.start()
+        try:
+            field.to_internal_value(data).close()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_peak_memory(self) -> None:
+        """Пиковая память не зависит от размера файла и намного меньше,
+           чем при декодировании строки целиком."""
+        buffer = BytesIO()
+        Image.frombytes("RGB", (1000, 1000), os.urandom(3_000_000)).save(
+            buffer, "PNG")
+        content = buffer.getvalue()
+        data = data_uri(content)
+
+        streaming = self.peak_memory(StreamingBase64ImageField(), data)
+        in_memory = self.peak_memory(InMemoryBase64ImageField(), data)
+
+        self.assertLess(streaming, len(content) // 4)
+        self.assertLess(streaming * 10, in_memory)
+
+
+class CookableTest(RecipesTestCase):
+    """Поиск по имеющимся ингредиентам отдаёт ограниченное число
+       рецептов."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        pantry._index = None
+        self.create_recipes(5)
+        self.url = (
+            "/api/recipes/cookable/?ingredients="
+            f"{self.ingredients[0].pk}"
+        )
+
+    @override_settings(PANTRY_MAX_RESULTS=3)
+    def test_without_limit(self) -> None:
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+
+    @override_settings(PANTRY_MAX_RESULTS=3)
+    def test_limit_above_maximum(self) -> None:
+        response = self.client.get(self.url + "&limit=10")
+
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual(len(response.data["results"]), 3)
+
+
+@override_settings(
+    METRICS_ALLOWED_NETWORKS=["127.0.0.1/32", "10.0.0.0/8"],
+    METRICS_TOKEN="secret",
+)
+class MetricsAccessTest(SimpleTestCase):
+
+    def test_allowed_networks(self) -> None:
+        for address in ("127.0.0.1", "10.1.2.3"):
+            with self.subTest(address=address):
+                response = self.client.get("/metrics", REMOTE_ADDR=address)
+                self.assertEqual(response.status_code, 200)
+
+    def test_other_clients_are_forbidden(self) -> None:
+        response = self.client.get("/metrics", REMOTE_ADDR="203.0.113.5")
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get(
+            "/metrics", REMOTE_ADDR="203.0.113.5",
+            HTTP_AUTHORIZATION="Bearer wrong",
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_token(self) -> None:
+        response = self.client.get(
+            "/metrics", REMOTE_ADDR="203.0.113.5",
+            HTTP_AUTHORIZATION="Bearer secret",
+        )
+        self.assertEqual(response.status_code, 200)
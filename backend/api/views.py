@@ -1,6 +1,12 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Q
-from django.http.response import HttpResponse
+from django.core.cache import cache
+from django.db.models import F, Prefetch, Q, QuerySet, Window
+from django.db.models.functions import RowNumber
+from django.http.response import (HttpResponseNotModified,
+                                  StreamingHttpResponse)
+from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags, quote_etag
 from django_filters import rest_framework as filters
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework.decorators import action
@@ -12,13 +18,23 @@ from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
 from api.filters import IngredientFilter, RecipeFilterSet
 from api.mixins import AddDelViewMixin
-from api.paginators import PageLimitPagination
+from api.paginators import (KeysetPagination, PageLimitPagination,
+                            RecipePagination)
 from api.permissions import AdminOrReadOnly, AuthorStaffOrReadOnly
-from api.serializers import (IngredientSerializer, RecipeSerializer,
-                             RecipeSummarySerializer, TagSerializer,
+from api.serializers import (IngredientSerializer, PantryRecipeSerializer,
+                             RecipeSerializer, RecipeSummarySerializer,
+                             ShoppingListItemSerializer, TagSerializer,
                              UserSubscribeSerializer)
-from core.services import create_shoping_list
-from recipes.models import Carts, Favorites, Ingredient, Recipe, Tag
+from core.cache import CachedResponseMixin, feed_cache_key
+from core.catalog import get_catalog
+from core.exporters import get_formatter
+from core.metrics import cache_hit
+from core.pantry import get_pantry_index
+from core.recommendations import recommended_recipe_ids, similar_recipe_ids
+from core.relations import get_relations
+from core.services import shopping_list_etag, shopping_list_ingredients
+from recipes.models import (Carts, Favorites, Ingredient, Recipe,
+                            ShoppingListItem, Tag)
 from users.models import Subscriptions
 
 User = get_user_model()
@@ -31,6 +47,40 @@ class UserViewSet(DjoserUserViewSet, AddDelViewMixin):
     add_serializer = UserSubscribeSerializer
     link_model = Subscriptions
 
+    def get_recipes_limit(self) -> int | None:
+        """Получает из запроса ограничение числа рецептов автора."""
+        recipes_limit = self.request.query_params.get("recipes_limit")
+
+        if recipes_limit and recipes_limit.isdigit() and int(recipes_limit):
+            return int(recipes_limit)
+
+        return None
+
+    def get_authors_queryset(self) -> QuerySet:
+        """Авторы с последними рецептами. Последние рецепты выбираются
+           одним запросом через оконную функцию ROW_NUMBER по каждому
+           автору."""
+        recipes = Recipe.objects.only(
+            "id", "name", "image", "image_renditions", "cooking_time",
+            "author", "pub_date"
+        )
+        recipes_limit = self.get_recipes_limit()
+
+        if recipes_limit is not None:
+            recipes = recipes.annotate(
+                row_number=Window(
+                    expression=RowNumber(),
+                    partition_by=F("author"),
+                    order_by=F("pub_date").desc(),
+                )
+            ).filter(row_number__lte=recipes_limit)
+
+        return User.objects.prefetch_related(
+            Prefetch("recipes", queryset=recipes))
+
+    def get_add_queryset(self) -> QuerySet:
+        return self.get_authors_queryset()
+
     @action(detail=True, permission_classes=(IsAuthenticated,))
     def subscribe(self, request, id: int | str) -> Response:
         """Создаёт, удаляет связь между пользователями."""
@@ -45,34 +95,68 @@ class UserViewSet(DjoserUserViewSet, AddDelViewMixin):
         """Удаляет связь подписки между пользователями."""
         return self._delete_relation(Q(author__id=id))
 
+    @action(
+        methods=("post", "delete"), detail=False,
+        url_path="subscriptions/bulk",
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_subscribe(self, request) -> Response:
+        """Подписывает на нескольких авторов или отписывает от них."""
+        return self._bulk_relation(request, relation_type="subscription")
+
     @action(
         methods=("get",), detail=False,
         permission_classes=(IsAuthenticated,)
     )
     def subscriptions(self, request) -> Response:
         """Получает список подписок пользователя."""
-        pages = self.paginate_queryset(
-            User.objects.filter(subscribers__user=self.request.user)
-        )
-        serializer = UserSubscribeSerializer(pages, many=True)
+        authors = self.get_authors_queryset().filter(
+            subscribers__user=self.request.user
+        ).order_by("-subscribers__date_added")
+        pages = self.paginate_queryset(authors)
+        context = self.get_serializer_context()
+
+        if pages is None:
+            serializer = UserSubscribeSerializer(
+                authors, many=True, context=context)
+            return Response(serializer.data)
+
+        # Все авторы страницы — подписки, проверять их не нужно.
+        get_relations(request).remember(
+            Subscriptions, (author.pk for author in pages), True)
+        serializer = UserSubscribeSerializer(
+            pages, many=True, context=context)
         return self.get_paginated_response(serializer.data)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(CachedResponseMixin, ReadOnlyModelViewSet):
     """Класс представления для тегов рецептов."""
+    cache_namespace = "tags"
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AdminOrReadOnly,)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(CachedResponseMixin, ReadOnlyModelViewSet):
     """Класс представления для ингредиентов рецептов."""
+    cache_namespace = "ingredients"
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AdminOrReadOnly,)
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs) -> Response:
+        """Список ингредиентов. При INGREDIENT_CATALOG_IN_MEMORY поиск
+           по началу названия идёт по каталогу в памяти без запроса
+           к базе."""
+        name = request.query_params.get("name")
+
+        if name and settings.INGREDIENT_CATALOG_IN_MEMORY:
+            return Response(get_catalog().search(name))
+
+        return super().list(request, *args, **kwargs)
+
 
 class RecipeViewSet(ModelViewSet, AddDelViewMixin):
     """Класс представления для рецептов с возможностью добавления в
@@ -80,11 +164,37 @@ class RecipeViewSet(ModelViewSet, AddDelViewMixin):
     queryset = Recipe.objects.select_related("author")
     serializer_class = RecipeSerializer
     permission_classes = (AuthorStaffOrReadOnly,)
-    pagination_class = PageLimitPagination
+    pagination_class = RecipePagination
     add_serializer = RecipeSummarySerializer
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = RecipeFilterSet
 
+    def get_queryset(self) -> QuerySet[Recipe]:
+        """Дополняет рецепты флагами текущего пользователя и заранее
+           загружает теги и ингредиенты, чтобы число запросов не зависело
+           от размера страницы."""
+        return self.queryset.with_related().with_user_flags(
+            self.request.user)
+
+    def _relation_created(self, relation: Favorites | Carts) -> None:
+        if isinstance(relation, Carts):
+            ShoppingListItem.objects.add_recipe(
+                relation.user_id, relation.recipe)
+
+    def _relation_deleted(self, relation: Favorites | Carts) -> None:
+        if isinstance(relation, Carts):
+            ShoppingListItem.objects.remove_recipe(
+                relation.user_id, relation.recipe)
+
+    def _relations_created(self, obj_ids: list[int]) -> None:
+        if self.link_model is Carts:
+            ShoppingListItem.objects.add_recipes(self.request.user.pk, obj_ids)
+
+    def _relations_deleted(self, obj_ids: list[int]) -> None:
+        if self.link_model is Carts:
+            ShoppingListItem.objects.remove_recipes(
+                self.request.user.pk, obj_ids)
+
     @action(detail=True, permission_classes=(IsAuthenticated,))
     def favorite(self, request, pk: int | str) -> Response:
         """Добавляет, удалет рецепт в избранное."""
@@ -101,6 +211,16 @@ class RecipeViewSet(ModelViewSet, AddDelViewMixin):
         self.link_model = Favorites
         return self._delete_relation(Q(recipe__id=pk))
 
+    @action(
+        methods=("post", "delete"), detail=False,
+        url_path="favorite/bulk",
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_favorite(self, request) -> Response:
+        """Добавляет в избранное или удаляет из него несколько рецептов."""
+        self.link_model = Favorites
+        return self._bulk_relation(request, relation_type="favorite")
+
     @action(detail=True, permission_classes=(IsAuthenticated,))
     def shopping_cart(self, request, pk: int | str) -> Response:
         """Добавляет, удалет рецепт в список покупок."""
@@ -119,16 +239,183 @@ class RecipeViewSet(ModelViewSet, AddDelViewMixin):
         self.link_model = Carts
         return self._delete_relation(Q(recipe__id=pk))
 
+    @action(
+        methods=("post", "delete"), detail=False,
+        url_path="shopping_cart/bulk",
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_shopping_cart(self, request) -> Response:
+        """Добавляет в список покупок или удаляет из него несколько
+           рецептов."""
+        self.link_model = Carts
+        return self._bulk_relation(request, relation_type="cart")
+
+    @action(
+        methods=("get",), detail=False,
+        permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request) -> Response:
+        """Рецепты авторов, на которых подписан пользователь, от новых к
+           старым с курсорной пагинацией. Первая страница кэшируется
+           для пользователя на FEED_CACHE_TIMEOUT секунд."""
+        paginator = KeysetPagination()
+        first_page = (
+            paginator.cursor_query_param not in request.query_params)
+        page_size = paginator.get_page_size(request)
+        key = feed_cache_key(request.user.pk)
+        pages = {}
+
+        if first_page:
+            pages = cache.get(key) or {}
+            cache_hit("feed", page_size in pages)
+            if page_size in pages:
+                return Response(pages[page_size])
+
+        recipes = self.get_queryset().filter(
+            author__subscribers__user=request.user)
+        page = paginator.paginate_queryset(recipes, request, self)
+        serializer = self.get_serializer(page, many=True)
+        data = paginator.get_paginated_response(serializer.data).data
+
+        if first_page:
+            pages[page_size] = data
+            cache.set(key, pages, settings.FEED_CACHE_TIMEOUT)
+        return Response(data)
+
     @action(methods=("get",), detail=False)
+    def cookable(self, request) -> Response:
+        """Рецепты, которые можно приготовить из имеющихся ингредиентов
+           (`ingredients`, можно повторять). Упорядочены по доле
+           имеющихся ингредиентов и числу недостающих; рецепты ищутся
+           по индексу в памяти, из базы читается только страница. В ответе
+           не больше PANTRY_MAX_RESULTS рецептов, в том числе без `limit`."""
+        values = request.query_params.getlist("ingredients")
+        ids = {
+            value.strip()
+            for item in values
+            for value in item.split(",")
+            if value.strip()
+        }
+
+        if not ids or not all(value.isdigit() for value in ids):
+            return Response(
+                {"error": "Укажите идентификаторы ингредиентов."},
+                status=HTTP_400_BAD_REQUEST,
+            )
+        if len(ids) > settings.PANTRY_MAX_INGREDIENTS:
+            return Response(
+                {
+                    "error": "Слишком много ингредиентов, не больше "
+                    f"{settings.PANTRY_MAX_INGREDIENTS}."
+                },
+                status=HTTP_400_BAD_REQUEST,
+            )
+
+        ranked = get_pantry_index().rank(int(value) for value in ids)
+        paginator = PageLimitPagination()
+        paginator.max_page_size = settings.PANTRY_MAX_RESULTS
+        page = paginator.paginate_queryset(ranked, request, self)
+        items = page
+        if page is None:
+            items = ranked[:settings.PANTRY_MAX_RESULTS]
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, *_ in items])
+        found = []
+
+        for recipe_id, count, required in items:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.coverage = round(count / required, 3)
+                recipe.missing = required - count
+                found.append(recipe)
+
+        serializer = PantryRecipeSerializer(
+            found, many=True, context=self.get_serializer_context())
+
+        if page is None:
+            return Response(serializer.data)
+        return paginator.get_paginated_response(serializer.data)
+
+    def get_neighbors_limit(self) -> int:
+        """Число рецептов из параметра `limit`, не больше
+           RECOMMENDATIONS_NEIGHBORS."""
+        limit = self.request.query_params.get("limit", "")
+        size = settings.RECOMMENDATIONS_NEIGHBORS
+
+        if limit.isdigit() and int(limit):
+            return min(int(limit), size)
+        return size
+
+    def recipes_response(self, recipe_ids: list[int]) -> Response:
+        """Рецепты в порядке recipe_ids; удалённые пропускаются."""
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes], many=True)
+        return Response(serializer.data)
+
+    @action(methods=("get",), detail=True)
+    def similar(self, request, pk: int | str) -> Response:
+        """Похожие рецепты по ингредиентам и тегам из заранее
+           посчитанной таблицы."""
+        recipe = get_object_or_404(Recipe.objects.only("pk"), pk=pk)
+        recipe_ids = similar_recipe_ids(recipe.pk, self.get_neighbors_limit())
+        return self.recipes_response(recipe_ids or [])
+
+    @action(
+        methods=("get",), detail=False,
+        permission_classes=(IsAuthenticated,)
+    )
+    def recommendations(self, request) -> Response:
+        """Рецепты, похожие на избранные пользователем."""
+        return self.recipes_response(
+            recommended_recipe_ids(
+                request.user.pk, self.get_neighbors_limit())
+        )
+
+    @action(
+        methods=("get",), detail=False,
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_cart_summary(self, request) -> Response:
+        """Сводный список покупок пользователя в формате JSON."""
+        items = ShoppingListItem.objects.filter(
+            user=request.user
+        ).select_related("ingredient").order_by("ingredient__name")
+        serializer = ShoppingListItemSerializer(items, many=True)
+        return Response(serializer.data)
+
+    @action(
+        methods=("get",), detail=False,
+        permission_classes=(IsAuthenticated,)
+    )
     def download_shopping_cart(self, request) -> Response:
-        """Загружает список покупок пользователя."""
+        """Загружает список покупок пользователя.
+           Формат задаётся параметром `type`: txt, csv, json или pdf."""
         user = self.request.user
-        if not user.carts.exists():
+        file_format = request.query_params.get("type", "txt")
+        formatter = get_formatter(file_format)
+
+        if formatter is None:
+            return Response(
+                {"error": f"Формат {file_format} не поддерживается."},
+                status=HTTP_400_BAD_REQUEST,
+            )
+
+        etag = shopping_list_etag(user, file_format)
+        if etag is None:
             return Response(status=HTTP_400_BAD_REQUEST)
 
-        filename = f"{user.username}_shopping_list.txt"
-        shopping_list = create_shoping_list(user)
-        response = HttpResponse(
-            shopping_list, content_type="text.txt; charset=utf-8")
+        etag = quote_etag(etag)
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+
+        filename = f"{user.username}_shopping_list.{formatter.extension}"
+        response = StreamingHttpResponse(
+            formatter(user).render(shopping_list_ingredients(user)),
+            content_type=formatter.content_type,
+        )
         response["Content-Disposition"] = f"attachment; filename={filename}"
+        response["ETag"] = etag
         return response
@@ -0,0 +1,93 @@
+from collections import OrderedDict
+from copy import copy
+from hashlib import sha256
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from core.cache import increment
+
+AUTH_VERSION_PREFIX = "auth_token_version"
+
+# Поля пользователя, изменение которых не влияет на аутентификацию.
+AUTH_IRRELEVANT_FIELDS = frozenset(("last_login",))
+
+_tokens: OrderedDict = OrderedDict()
+_lock = Lock()
+
+
+def _version_key(key: str) -> str:
+    # В общий кэш попадает не сам токен, а его хэш.
+    return f"{AUTH_VERSION_PREFIX}:{sha256(key.encode()).hexdigest()}"
+
+
+def invalidate_token(key: str) -> None:
+    """Делает недействительным закэшированный токен во всех процессах."""
+    increment(_version_key(key))
+
+
+def invalidate_user_tokens(user_id: int) -> None:
+    for key in Token.objects.filter(user_id=user_id).values_list(
+        "key", flat=True
+    ):
+        invalidate_token(key)
+
+
+def clear_token_cache() -> None:
+    with _lock:
+        _tokens.clear()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с LRU-кэшем в памяти процесса: токен →
+       снимок пользователя и токена. Запись живёт не дольше
+       AUTH_TOKEN_CACHE_TIMEOUT секунд и сбрасывается при смене версии
+       токена в общем кэше: выход, смена пароля, блокировка.
+       При AUTH_TOKEN_CACHE_TIMEOUT=0 работает как TokenAuthentication."""
+
+    def authenticate_credentials(self, key: str) -> tuple:
+        timeout = settings.AUTH_TOKEN_CACHE_TIMEOUT
+        if timeout <= 0:
+            return super().authenticate_credentials(key)
+
+        version = cache.get(_version_key(key), 0)
+
+        with _lock:
+            entry = _tokens.get(key)
+            if entry is not None:
+                _tokens.move_to_end(key)
+
+        if entry is not None:
+            user, token, expires, cached_version = entry
+            if expires > monotonic() and cached_version == version:
+                # Копии, чтобы изменения request.user не попадали в кэш.
+                return copy(user), copy(token)
+
+        # Версия прочитана до загрузки: если пользователя изменят во
+        # время неё, запись устареет при следующей проверке.
+        user, token = super().authenticate_credentials(key)
+
+        with _lock:
+            _tokens[key] = (
+                copy(user), copy(token), monotonic() + timeout, version)
+            _tokens.move_to_end(key)
+            while len(_tokens) > settings.AUTH_TOKEN_CACHE_SIZE:
+                _tokens.popitem(last=False)
+        return user, token
+
+
+def token_deleted(sender, instance: Token, **kwargs) -> None:
+    """Обработчик post_delete токена: выход через auth/token/logout."""
+    invalidate_token(instance.key)
+
+
+def user_changed(sender, instance, update_fields=None, **kwargs) -> None:
+    """Обработчик post_save пользователя: смена пароля, блокировка и
+       другие изменения профиля."""
+    if update_fields and AUTH_IRRELEVANT_FIELDS.issuperset(update_fields):
+        return
+    invalidate_user_tokens(instance.pk)
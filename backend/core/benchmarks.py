@@ -0,0 +1,585 @@
+import tracemalloc
+from collections import Counter
+from math import ceil
+from random import Random
+from time import perf_counter
+from typing import Callable
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.http import HttpResponse
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import pantry
+from core.cache import feed_cache_key
+from core.counters import change_relation_counters
+from core.images import render_renditions
+from core.metrics import QueryCounter
+from core.pantry import get_pantry_index, load_index
+from core.recommendations import load_similarity_index
+from recipes.models import (Carts, Ingredient, Recipe, ShoppingListItem,
+                            Tag)
+
+User = get_user_model()
+
+SCENARIOS: dict[str, "Scenario"] = {}
+
+# Допустимый рост пиковой памяти относительно memory_baseline.
+MEMORY_GROWTH_LIMIT = 1.5
+
+# Однопиксельный PNG для создания рецептов.
+PIXEL_PNG = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1Pe"
+    "AAAADElEQVR4nGP4z8AAAAMBAQDJ/pLvAAAAAElFTkSuQmCC"
+)
+
+
+def register_scenario(scenario_class: type) -> type:
+    """Регистрирует сценарий под его именем."""
+    SCENARIOS[scenario_class.name] = scenario_class()
+    return scenario_class
+
+
+def percentile(values: list[float], rank: float) -> float:
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[max(ceil(rank / 100 * len(ordered)) - 1, 0)]
+
+
+class BenchmarkContext:
+    """Пользователь и выборки данных, общие для всех сценариев. По
+       умолчанию берётся пользователь с наибольшим числом подписок."""
+
+    def __init__(self, user_id: int | None = None, seed: int = 1) -> None:
+        users = User.objects.all()
+        if user_id is not None:
+            users = users.filter(pk=user_id)
+        self.user = users.annotate(
+            subscriptions_total=Count("subscriptions")
+        ).order_by("-subscriptions_total", "pk").first()
+
+        if self.user is None:
+            raise ValueError("Нет пользователей, сначала generate_data.")
+
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.rng = Random(seed)
+        self.recipe_ids = list(
+            Recipe.objects.order_by("-pub_date").values_list(
+                "pk", flat=True)[:1000]
+        )
+        self.tag_ids = list(Tag.objects.values_list("pk", flat=True))
+        self.tag_slugs = list(Tag.objects.values_list("slug", flat=True))
+        self.ingredient_ids = list(
+            Ingredient.objects.order_by("pk").values_list(
+                "pk", flat=True)[:200]
+        )
+        self.prefixes = [
+            name[:3]
+            for name in Ingredient.objects.order_by("?").values_list(
+                "name", flat=True)[:200]
+        ]
+        self.created: list[int] = []
+
+
+class Scenario:
+    """Сценарий нагрузки: один вызов run — одно измерение. budget_ms —
+       допустимая задержка p99, memory_baseline — сценарий, пиковую
+       память которого нельзя превышать больше чем в
+       MEMORY_GROWTH_LIMIT раз; оба проверяются при --check-budgets."""
+
+    name = ""
+    settings: dict = {}
+    memory = False
+    budget_ms: float | None = None
+    memory_baseline: str | None = None
+
+    def setup(self, ctx: BenchmarkContext) -> None:
+        pass
+
+    def teardown(self, ctx: BenchmarkContext) -> None:
+        pass
+
+    def request(self, ctx: BenchmarkContext, i: int) -> tuple:
+        raise NotImplementedError
+
+    def run(self, ctx: BenchmarkContext, i: int) -> HttpResponse | None:
+        method, path, *data = self.request(ctx, i)
+        return getattr(ctx.client, method)(
+            path, *data, format="json")
+
+
+@register_scenario
+class RecipesList(Scenario):
+    """Список рецептов с кэшем токенов: бенчмарк идёт в одном процессе,
+       так что кэш включён и при LocMemCache."""
+    name = "recipes_list"
+    settings = {"AUTH_TOKEN_CACHE_TIMEOUT": 30}
+
+    def request(self, ctx, i):
+        return "get", f"/api/recipes/?page={i % 50 + 1}&limit=6"
+
+
+@register_scenario
+class RecipesListTokenDatabase(RecipesList):
+    """Тот же список с проверкой токена запросом к базе."""
+    name = "recipes_list_token_db"
+    settings = {"AUTH_TOKEN_CACHE_TIMEOUT": 0}
+
+
+@register_scenario
+class TagsList(Scenario):
+    """Закэшированный список тегов: время ответа определяется в основном
+       аутентификацией."""
+    name = "tags_list"
+    settings = {"AUTH_TOKEN_CACHE_TIMEOUT": 30}
+
+    def request(self, ctx, i):
+        return "get", "/api/tags/"
+
+
+@register_scenario
+class TagsListTokenDatabase(TagsList):
+    name = "tags_list_token_db"
+    settings = {"AUTH_TOKEN_CACHE_TIMEOUT": 0}
+
+
+@register_scenario
+class RecipesFiltered(Scenario):
+    name = "recipes_filtered"
+
+    def request(self, ctx, i):
+        tags = "&".join(
+            f"tags={slug}" for slug in ctx.rng.sample(
+                ctx.tag_slugs, min(2, len(ctx.tag_slugs)))
+        )
+        return "get", f"/api/recipes/?{tags}&is_favorited=0&limit=6"
+
+
+@register_scenario
+class RecipesFavorited(Scenario):
+    name = "recipes_favorited"
+
+    def request(self, ctx, i):
+        return "get", "/api/recipes/?is_favorited=1&limit=6"
+
+
+@register_scenario
+class RecipesPopular(Scenario):
+    name = "recipes_popular"
+
+    def request(self, ctx, i):
+        return "get", "/api/recipes/?ordering=popular&limit=6"
+
+
+@register_scenario
+class RecipesSearch(Scenario):
+    name = "recipes_search"
+
+    def request(self, ctx, i):
+        return (
+            "get",
+            f"/api/recipes/?search=рецепт {ctx.rng.randint(0, 999)}&limit=6",
+        )
+
+
+@register_scenario
+class RecipesCursor(Scenario):
+    name = "recipes_cursor"
+
+    def request(self, ctx, i):
+        return "get", "/api/recipes/?pagination=cursor&limit=6"
+
+
+@register_scenario
+class RecipeDetail(Scenario):
+    name = "recipe_detail"
+
+    def request(self, ctx, i):
+        return "get", f"/api/recipes/{ctx.rng.choice(ctx.recipe_ids)}/"
+
+
+@register_scenario
+class Feed(Scenario):
+    """Лента без кэша: кэш первой страницы сбрасывается перед каждым
+       запросом."""
+    name = "feed"
+
+    def run(self, ctx, i):
+        cache.delete(feed_cache_key(ctx.user.pk))
+        return super().run(ctx, i)
+
+    def request(self, ctx, i):
+        return "get", "/api/recipes/feed/?limit=6"
+
+
+@register_scenario
+class FeedCached(Feed):
+    name = "feed_cached"
+
+    def run(self, ctx, i):
+        return Scenario.run(self, ctx, i)
+
+
+@register_scenario
+class Subscriptions(Scenario):
+    name = "subscriptions"
+
+    def request(self, ctx, i):
+        return "get", "/api/users/subscriptions/?limit=6&recipes_limit=3"
+
+
+@register_scenario
+class ShoppingCartSummary(Scenario):
+    name = "shopping_cart_summary"
+
+    def request(self, ctx, i):
+        return "get", "/api/recipes/shopping_cart_summary/"
+
+
+class DownloadShoppingCart(Scenario):
+    """Скачивание списка покупок отдельного пользователя, в корзине
+       которого cart_size первых рецептов. Список отдаётся потоком,
+       поэтому пиковая память не должна расти с размером корзины: при
+       --check-budgets она сравнивается с memory_baseline — тем же
+       форматом для корзины из 100 рецептов."""
+    memory = True
+    file_format = ""
+    cart_size = 100
+
+    @property
+    def memory_baseline(self) -> str | None:
+        if self.cart_size == 100:
+            return None
+        return f"download_shopping_cart_{self.file_format}"
+
+    def setup(self, ctx):
+        self.user = User.objects.create_user(
+            username=f"benchmark_cart_{self.name}",
+            email=f"benchmark_cart_{self.name}@example.com",
+            first_name="Benchmark",
+            last_name="Cart",
+        )
+        recipe_ids = list(
+            Recipe.objects.order_by("pk").values_list("pk", flat=True)[
+                :self.cart_size]
+        )
+        Carts.objects.bulk_create(
+            (Carts(user=self.user, recipe_id=pk) for pk in recipe_ids),
+            batch_size=1000,
+        )
+        change_relation_counters(Carts, recipe_ids, 1)
+        ShoppingListItem.objects.add_recipes(self.user.pk, recipe_ids)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def teardown(self, ctx):
+        self.user.delete()
+
+    def run(self, ctx, i):
+        return self.client.get(
+            "/api/recipes/download_shopping_cart/",
+            {"type": self.file_format},
+        )
+
+
+for _format in ("txt", "csv", "json", "pdf"):
+    for _size, _suffix in ((100, ""), (10_000, "_10k")):
+        register_scenario(
+            type(
+                f"DownloadShoppingCart{_format.title()}{_suffix}",
+                (DownloadShoppingCart,),
+                {"name": f"download_shopping_cart_{_format}{_suffix}",
+                 "file_format": _format, "cart_size": _size},
+            )
+        )
+
+
+@register_scenario
+class IngredientSearchDatabase(Scenario):
+    """Поиск ингредиентов запросом к базе, кэш ответов отключён."""
+    name = "ingredient_search_db"
+    settings = {
+        "INGREDIENT_CATALOG_IN_MEMORY": False,
+        "RESPONSE_CACHE_TIMEOUT": 0,
+    }
+
+    def request(self, ctx, i):
+        return "get", f"/api/ingredients/?name={ctx.rng.choice(ctx.prefixes)}"
+
+
+@register_scenario
+class IngredientSearchCatalog(IngredientSearchDatabase):
+    name = "ingredient_search_catalog"
+    settings = {"INGREDIENT_CATALOG_IN_MEMORY": True}
+
+
+class RecipeCreate(Scenario):
+    """Создание рецепта с заданным числом ингредиентов. Созданные
+       рецепты удаляются после прогона."""
+    ingredients = 1
+
+    def request(self, ctx, i):
+        ingredients = ctx.rng.sample(
+            ctx.ingredient_ids,
+            min(self.ingredients, len(ctx.ingredient_ids)),
+        )
+        return "post", "/api/recipes/", {
+            "name": f"Замер {self.name} {i} {ctx.rng.random()}",
+            "text": "Рецепт из нагрузочного теста.",
+            "cooking_time": 10,
+            "image": PIXEL_PNG,
+            "tags": ctx.tag_ids[:1],
+            "ingredients": [
+                {"id": pk, "amount": ctx.rng.randint(1, 32)}
+                for pk in ingredients
+            ],
+        }
+
+    def run(self, ctx, i):
+        response = super().run(ctx, i)
+        if response.status_code == 201:
+            ctx.created.append(response.data["id"])
+        return response
+
+    def teardown(self, ctx):
+        for recipe in Recipe.objects.filter(pk__in=ctx.created):
+            recipe.delete()
+        ctx.created.clear()
+
+
+for _size in (1, 10, 50):
+    register_scenario(
+        type(
+            f"RecipeCreate{_size}",
+            (RecipeCreate,),
+            {"name": f"recipe_create_{_size}", "ingredients": _size},
+        )
+    )
+
+
+@register_scenario
+class Pantry(Scenario):
+    """Поиск рецептов по десяти случайным ингредиентам."""
+    name = "pantry"
+    budget_ms = 50
+
+    def request(self, ctx, i):
+        ingredients = ctx.rng.sample(
+            ctx.ingredient_ids, min(10, len(ctx.ingredient_ids)))
+        return (
+            "get",
+            "/api/recipes/cookable/?limit=6&ingredients="
+            + ",".join(map(str, ingredients)),
+        )
+
+
+@register_scenario
+class PantryStaleIndex(Pantry):
+    """Тот же поиск, когда перед каждым запросом индекс устаревает:
+       перестройка идёт в фоне и не должна задерживать ответ."""
+    name = "pantry_stale_index"
+
+    def setup(self, ctx):
+        get_pantry_index()
+
+    def teardown(self, ctx):
+        # Дожидается фоновой перестройки.
+        with pantry._lock:
+            pass
+
+    def run(self, ctx, i):
+        pantry._index.built -= settings.IN_MEMORY_INDEX_MAX_AGE
+        return super().run(ctx, i)
+
+
+@register_scenario
+class PantryIndexBuild(Scenario):
+    """Построение индекса ингредиент → рецепты из базы без HTTP."""
+    name = "pantry_index_build"
+    memory = True
+
+    def run(self, ctx, i):
+        load_index(None)
+        return None
+
+
+@register_scenario
+class SimilarRecipes(Scenario):
+    name = "similar_recipes"
+
+    def request(self, ctx, i):
+        return (
+            "get",
+            f"/api/recipes/{ctx.rng.choice(ctx.recipe_ids)}/similar/",
+        )
+
+
+@register_scenario
+class Recommendations(Scenario):
+    name = "recommendations"
+
+    def request(self, ctx, i):
+        return "get", "/api/recipes/recommendations/"
+
+
+@register_scenario
+class SimilarityIndexBuild(Scenario):
+    """Загрузка векторов рецептов из базы без HTTP."""
+    name = "similarity_index_build"
+    memory = True
+
+    def run(self, ctx, i):
+        load_similarity_index()
+        return None
+
+
+@register_scenario
+class SimilarityNeighbors(Scenario):
+    """Поиск похожих для ста рецептов по готовому индексу: полный
+       пересчёт build_recommendations занимает примерно число рецептов
+       / 100 таких измерений."""
+    name = "similarity_neighbors"
+
+    def setup(self, ctx):
+        self.index = load_similarity_index()
+        self.recipe_ids = list(self.index.recipe_ids)
+
+    def teardown(self, ctx):
+        self.index = self.recipe_ids = None
+
+    def run(self, ctx, i):
+        for recipe_id in ctx.rng.sample(
+            self.recipe_ids, min(100, len(self.recipe_ids))
+        ):
+            self.index.neighbors(
+                recipe_id,
+                settings.RECOMMENDATIONS_NEIGHBORS,
+                settings.RECOMMENDATIONS_MAX_POSTINGS,
+            )
+        return None
+
+
+@register_scenario
+class ImageRenditions(Scenario):
+    """Построение всех вариантов изображения рецепта без HTTP."""
+    name = "image_renditions"
+
+    def setup(self, ctx):
+        self.image = (
+            Recipe.objects.exclude(image="").values_list(
+                "image", flat=True).first()
+        )
+
+    def run(self, ctx, i):
+        if self.image:
+            render_renditions(self.image)
+        return None
+
+
+def measure(
+    scenario: Scenario, ctx: BenchmarkContext, iterations: int, warmup: int
+) -> dict:
+    """Выполняет сценарий и возвращает пропускную способность,
+       перцентили задержки, число запросов к базе и статусы ответов."""
+    durations, queries, peaks = [], [], []
+    statuses: Counter[str] = Counter()
+
+    with override_settings(**scenario.settings):
+        scenario.setup(ctx)
+        try:
+            for i in range(warmup):
+                consume(scenario.run(ctx, i))
+
+            for i in range(iterations):
+                counter = QueryCounter()
+                if scenario.memory:
+                    tracemalloc.start()
+
+                start = perf_counter()
+                with connection.execute_wrapper(counter):
+                    response = scenario.run(ctx, warmup + i)
+                    consume(response)
+                durations.append(perf_counter() - start)
+
+                if scenario.memory:
+                    peaks.append(tracemalloc.get_traced_memory()[1])
+                    tracemalloc.stop()
+
+                queries.append(counter.count)
+                statuses[
+                    str(response.status_code) if response else "none"] += 1
+        finally:
+            scenario.teardown(ctx)
+
+    total = sum(durations)
+    result = {
+        "iterations": iterations,
+        "throughput_rps": round(iterations / total, 2) if total else 0,
+        "latency_ms": {
+            "mean": round(total / iterations * 1000, 3),
+            "p50": round(percentile(durations, 50) * 1000, 3),
+            "p90": round(percentile(durations, 90) * 1000, 3),
+            "p99": round(percentile(durations, 99) * 1000, 3),
+            "max": round(max(durations) * 1000, 3),
+        },
+        "queries": {
+            "mean": round(sum(queries) / iterations, 2),
+            "max": max(queries),
+        },
+        "statuses": dict(statuses),
+    }
+    if peaks:
+        result["peak_memory_kb"] = round(max(peaks) / 1024, 1)
+    if scenario.budget_ms is not None:
+        result["budget_ms"] = scenario.budget_ms
+    if scenario.memory_baseline is not None:
+        result["memory_baseline"] = scenario.memory_baseline
+    return result
+
+
+def memory_growth(results: dict[str, dict]) -> dict[str, float]:
+    """Во сколько раз пиковая память сценариев превышает память их
+       memory_baseline, если оба сценария были запущены."""
+    growth = {}
+
+    for name, result in results.items():
+        baseline = results.get(result.get("memory_baseline"))
+        if baseline and baseline.get("peak_memory_kb"):
+            growth[name] = round(
+                result["peak_memory_kb"] / baseline["peak_memory_kb"], 2)
+    return growth
+
+
+def consume(response: HttpResponse | None) -> None:
+    """Дочитывает ответ, в том числе потоковый."""
+    if response is not None and response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+def run_benchmarks(
+    names: list[str],
+    iterations: int,
+    warmup: int,
+    user_id: int | None = None,
+    seed: int = 1,
+    progress: Callable[[str, dict], None] | None = None,
+) -> dict[str, dict]:
+    ctx = BenchmarkContext(user_id, seed)
+    results = {}
+
+    for name in names:
+        results[name] = measure(SCENARIOS[name], ctx, iterations, warmup)
+        if progress is not None:
+            progress(name, results[name])
+    return results
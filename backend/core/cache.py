@@ -0,0 +1,163 @@
+from collections import Counter
+from hashlib import md5
+from threading import Lock
+from typing import Callable
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from core.metrics import cache_hit
+
+RESPONSE_CACHE_PREFIX = "response_cache"
+RESPONSE_CACHE_MODELS = {
+    "recipes.Tag": "tags",
+    "recipes.Ingredient": "ingredients",
+}
+RESPONSE_CACHE_NAMESPACES = tuple(RESPONSE_CACHE_MODELS.values())
+FEED_CACHE_PREFIX = "feed"
+
+_pending_stats: Counter[str] = Counter()
+_pending_stats_lock = Lock()
+
+
+def _version_key(namespace: str) -> str:
+    return f"{RESPONSE_CACHE_PREFIX}:{namespace}:version"
+
+
+def _counter_key(namespace: str, counter: str) -> str:
+    return f"{RESPONSE_CACHE_PREFIX}:{namespace}:{counter}"
+
+
+def increment(key: str, delta: int = 1) -> None:
+    """Атомарно увеличивает счётчик в кэше, создавая его при отсутствии."""
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, timeout=None)
+
+
+def bump_version(namespace: str) -> None:
+    """Делает недействительными все ответы пространства имён."""
+    increment(_version_key(namespace))
+
+
+def invalidate_response_cache(sender, **kwargs) -> None:
+    """Обработчик сигналов post_save/post_delete кэшируемых моделей."""
+    bump_version(RESPONSE_CACHE_MODELS[sender._meta.label])
+
+
+def feed_cache_key(user_id: int) -> str:
+    """Ключ первой страницы ленты подписок пользователя."""
+    return f"{FEED_CACHE_PREFIX}:{user_id}"
+
+
+def invalidate_feeds(user_ids: list[int]) -> None:
+    """Сбрасывает закэшированные ленты пользователей."""
+    if user_ids:
+        cache.delete_many([feed_cache_key(pk) for pk in user_ids])
+
+
+def invalidate_author_feeds(author_id: int) -> None:
+    """Сбрасывает ленты всех подписчиков автора."""
+    Subscriptions = apps.get_model("users", "Subscriptions")
+    invalidate_feeds(
+        list(
+            Subscriptions.objects.filter(author_id=author_id).values_list(
+                "user_id", flat=True)
+        )
+    )
+
+
+def count_response(namespace: str, hit: bool) -> None:
+    """Учитывает попадание или промах кэша ответов. Счётчики копятся в
+       памяти процесса и переносятся в общий кэш раз в
+       RESPONSE_CACHE_STATS_BATCH ответов, а не на каждый ответ."""
+    cache_hit(namespace, hit)
+    key = _counter_key(namespace, "hits" if hit else "misses")
+
+    with _pending_stats_lock:
+        _pending_stats[key] += 1
+        if sum(_pending_stats.values()) < settings.RESPONSE_CACHE_STATS_BATCH:
+            return
+        pending = dict(_pending_stats)
+        _pending_stats.clear()
+
+    for key, delta in pending.items():
+        increment(key, delta)
+
+
+def response_cache_stats() -> dict[str, dict[str, int]]:
+    """Число попаданий и промахов кэша ответов по пространствам имён.
+       Последние, ещё не перенесённые из воркеров ответы не учтены."""
+    keys = {
+        (namespace, counter): _counter_key(namespace, counter)
+        for namespace in RESPONSE_CACHE_NAMESPACES
+        for counter in ("hits", "misses")
+    }
+    values = cache.get_many(keys.values())
+    stats = {}
+
+    for (namespace, counter), key in keys.items():
+        stats.setdefault(namespace, {})[counter] = values.get(key, 0)
+    return stats
+
+
+class CachedResponseMixin:
+    """Кэширует готовые JSON-ответы list и retrieve. Ключ строится по
+       пути с параметрами запроса и версии пространства имён, которая
+       меняется при изменении моделей. Поддерживает If-None-Match."""
+
+    cache_namespace: str = ""
+
+    def list(self, request: Request, *args, **kwargs) -> HttpResponse:
+        return self.cached_response(
+            request, super().list, *args, **kwargs)
+
+    def retrieve(self, request: Request, *args, **kwargs) -> HttpResponse:
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs)
+
+    def cached_response(
+        self, request: Request, handler: Callable[..., Response],
+        *args, **kwargs
+    ) -> HttpResponse:
+        if request.accepted_renderer.format != "json":
+            return handler(request, *args, **kwargs)
+
+        version = cache.get(_version_key(self.cache_namespace), 0)
+        path_hash = md5(request.get_full_path().encode()).hexdigest()
+        key = (
+            f"{RESPONSE_CACHE_PREFIX}:{self.cache_namespace}:"
+            f"{version}:{path_hash}"
+        )
+        entry = cache.get(key)
+
+        if entry is None:
+            count_response(self.cache_namespace, False)
+            response = handler(request, *args, **kwargs)
+
+            if response.status_code != 200:
+                return response
+
+            content = JSONRenderer().render(response.data)
+            entry = (quote_etag(md5(content).hexdigest()), content)
+            cache.set(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+        else:
+            count_response(self.cache_namespace, True)
+
+        etag, content = entry
+
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type="application/json")
+
+        response["ETag"] = etag
+        return response
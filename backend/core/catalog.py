@@ -0,0 +1,116 @@
+from array import array
+from bisect import bisect_left
+from sys import intern
+from threading import Lock
+from time import monotonic
+from typing import Iterable
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+from core.cache import increment
+from core.search import name_candidates, normalize_name
+
+CATALOG_VERSION_KEY = "ingredient_catalog_version"
+
+_catalog: "IngredientCatalog | None" = None
+_lock = Lock()
+
+
+class IngredientCatalog:
+    """Каталог ингредиентов в памяти процесса. Названия хранятся
+       отсортированными, поиск по началу названия сводится к двум
+       бинарным поискам по массиву ключей."""
+
+    __slots__ = (
+        "keys", "ids", "names", "units", "version", "pks", "built")
+
+    def __init__(
+        self, rows: Iterable[tuple[int, str, str]], version: int | None
+    ) -> None:
+        rows = sorted(
+            (normalize_name(name), pk, name, unit) for pk, name, unit in rows
+        )
+        self.keys = [key for key, *_ in rows]
+        self.ids = array("q", (pk for _, pk, _, _ in rows))
+        self.names = [name for *_, name, _ in rows]
+        self.units = [intern(unit) for *_, unit in rows]
+        self.version = version
+        self.pks = frozenset(self.ids)
+        self.built = monotonic()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, pk: int) -> bool:
+        return pk in self.pks
+
+    def prefix_range(self, prefix: str) -> range:
+        """Позиции названий, начинающихся с prefix."""
+        start = bisect_left(self.keys, prefix)
+        stop = bisect_left(self.keys, prefix + "\U0010ffff", lo=start)
+        return range(start, stop)
+
+    def search(self, value: str) -> list[dict]:
+        """Ингредиенты, название которых начинается с введённого текста
+           или с него же в другой раскладке."""
+        found, seen = [], set()
+
+        for candidate in name_candidates(value):
+            for position in self.prefix_range(normalize_name(candidate)):
+                if position in seen:
+                    continue
+
+                seen.add(position)
+                found.append(
+                    {
+                        "id": self.ids[position],
+                        "name": self.names[position],
+                        "measurement_unit": self.units[position],
+                    }
+                )
+        return found
+
+
+def load_catalog(version: int | None) -> IngredientCatalog:
+    Ingredient = apps.get_model("recipes", "Ingredient")
+    return IngredientCatalog(
+        Ingredient.objects.values_list("id", "name", "measurement_unit")
+        .iterator(),
+        version,
+    )
+
+
+def _is_fresh(catalog: IngredientCatalog, version: int | None) -> bool:
+    return (
+        catalog.version == version
+        and monotonic() - catalog.built < settings.IN_MEMORY_INDEX_MAX_AGE
+    )
+
+
+def get_catalog() -> IngredientCatalog:
+    """Возвращает актуальный каталог, перечитывая его из базы, если
+       версия в общем кэше изменилась в любом из процессов или каталог
+       старше IN_MEMORY_INDEX_MAX_AGE секунд."""
+    global _catalog
+
+    version = cache.get(CATALOG_VERSION_KEY)
+    catalog = _catalog
+
+    if catalog is not None and _is_fresh(catalog, version):
+        return catalog
+
+    with _lock:
+        if _catalog is None or not _is_fresh(_catalog, version):
+            _catalog = load_catalog(version)
+        return _catalog
+
+
+def invalidate_catalog(**kwargs) -> None:
+    """Обработчик сигналов post_save/post_delete ингредиента.
+       Меняет версию каталога для всех процессов."""
+    global _catalog
+
+    increment(CATALOG_VERSION_KEY)
+    _catalog = None
@@ -0,0 +1,77 @@
+from typing import Iterable, Type
+
+from django.apps import apps
+from django.db.models import (Count, F, IntegerField, Model, OuterRef,
+                              Subquery, Value)
+from django.db.models.functions import Coalesce, Greatest
+
+# Связь -> (поле связи с объектом, счётчик на объекте).
+RELATION_COUNTERS = {
+    "recipes.Favorites": ("recipe", "favorites_count"),
+    "recipes.Carts": ("recipe", "carts_count"),
+    "users.Subscriptions": ("author", "subscribers_count"),
+}
+
+
+def change_counter(
+    model: Type[Model], counter: str, pks: Iterable[int], delta: int
+) -> None:
+    """Атомарно меняет счётчик у объектов одним UPDATE. Значение не
+       опускается ниже нуля, даже если счётчик успел разойтись."""
+    pks = list(pks)
+    if pks and delta:
+        model.objects.filter(pk__in=pks).update(
+            **{counter: Greatest(F(counter) + delta, Value(0))}
+        )
+
+
+def change_relation_counters(
+    link_model: Type[Model], pks: Iterable[int], delta: int
+) -> None:
+    """Меняет счётчик объектов, с которыми созданы или удалены связи
+       link_model."""
+    counter = RELATION_COUNTERS.get(link_model._meta.label)
+    if counter is None:
+        return
+
+    field, counter = counter
+    model = link_model._meta.get_field(field).related_model
+    change_counter(model, counter, pks, delta)
+
+
+def count_relation(relation: Model, delta: int) -> None:
+    """Меняет счётчик объекта, связь с которым создана или удалена."""
+    counter = RELATION_COUNTERS.get(relation._meta.label)
+    if counter is not None:
+        field, _ = counter
+        change_relation_counters(
+            type(relation), [getattr(relation, f"{field}_id")], delta)
+
+
+def discount_user_relations(instance: Model, **kwargs) -> None:
+    """Обработчик pre_delete пользователя. Его избранное, корзина и
+       подписки удаляются каскадом, без счётчиков, поэтому рецепты и
+       авторы теряют по одной связи заранее, в той же транзакции."""
+    for label, (field, _) in RELATION_COUNTERS.items():
+        link_model = apps.get_model(label)
+        change_relation_counters(
+            link_model,
+            link_model.objects.filter(user=instance).values_list(
+                f"{field}_id", flat=True),
+            -1,
+        )
+
+
+def actual_count(link_model: Type[Model], field: str) -> Coalesce:
+    """Подзапрос с фактическим числом связей объекта."""
+    return Coalesce(
+        Subquery(
+            link_model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("pk"))
+            .values("count"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
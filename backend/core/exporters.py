@@ -0,0 +1,203 @@
+import csv
+import json
+from datetime import datetime as dt
+from io import BytesIO
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Type
+
+from django.conf import settings
+
+from foodgram.settings import DATE_TIME_FORMAT
+
+if TYPE_CHECKING:
+    from users.models import NewUser
+
+FORMATTERS: dict[str, Type["ShoppingListFormatter"]] = {}
+
+
+def register_formatter(
+    name: str,
+) -> Callable[[Type["ShoppingListFormatter"]], Type["ShoppingListFormatter"]]:
+    """Регистрирует форматтер списка покупок под указанным именем."""
+
+    def decorator(
+        formatter: Type["ShoppingListFormatter"],
+    ) -> Type["ShoppingListFormatter"]:
+        FORMATTERS[name] = formatter
+        return formatter
+
+    return decorator
+
+
+def get_formatter(name: str) -> Type["ShoppingListFormatter"] | None:
+    """Возвращает форматтер по имени или None, если формат неизвестен."""
+    return FORMATTERS.get(name)
+
+
+class ShoppingListFormatter:
+    """Базовый форматтер списка покупок. Отдаёт документ частями,
+       не собирая его целиком в памяти."""
+
+    extension: str = ""
+    content_type: str = ""
+
+    def __init__(self, user: "NewUser") -> None:
+        self.user = user
+        self.created = dt.now().strftime(DATE_TIME_FORMAT)
+
+    def header(self) -> Iterator[str | bytes]:
+        return iter(())
+
+    def row(self, ingredient: dict) -> str | bytes:
+        raise NotImplementedError(
+            "Метод `row` должен быть переопределен.")
+
+    def footer(self) -> Iterator[str | bytes]:
+        return iter(())
+
+    def render(self, ingredients: Iterable[dict]) -> Iterator[str | bytes]:
+        """Формирует документ из строк вида
+           {"name": ..., "measurement": ..., "amount": ...}."""
+        yield from self.header()
+
+        for ingredient in ingredients:
+            yield self.row(ingredient)
+
+        yield from self.footer()
+
+
+@register_formatter("txt")
+class TextFormatter(ShoppingListFormatter):
+    """Список покупок простым текстом."""
+
+    extension = "txt"
+    content_type = "text/plain; charset=utf-8"
+
+    def header(self) -> Iterator[str]:
+        yield (
+            f"Список покупок для:\n\n{self.user.first_name}\n"
+            f"{self.created}\n\n"
+        )
+
+    def row(self, ingredient: dict) -> str:
+        return (
+            f'{ingredient["name"]}: {ingredient["amount"]} '
+            f'{ingredient["measurement"]}\n'
+        )
+
+    def footer(self) -> Iterator[str]:
+        yield "\nПосчитано в Foodgram"
+
+
+class _Echo:
+    """Псевдобуфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+@register_formatter("csv")
+class CsvFormatter(ShoppingListFormatter):
+    """Список покупок в формате CSV."""
+
+    extension = "csv"
+    content_type = "text/csv; charset=utf-8"
+
+    def __init__(self, user: "NewUser") -> None:
+        super().__init__(user)
+        self.writer = csv.writer(_Echo())
+
+    def header(self) -> Iterator[str]:
+        yield self.writer.writerow(("name", "amount", "measurement_unit"))
+
+    def row(self, ingredient: dict) -> str:
+        return self.writer.writerow(
+            (ingredient["name"], ingredient["amount"],
+             ingredient["measurement"])
+        )
+
+
+@register_formatter("json")
+class JsonFormatter(ShoppingListFormatter):
+    """Список покупок в формате JSON."""
+
+    extension = "json"
+    content_type = "application/json; charset=utf-8"
+
+    def render(self, ingredients: Iterable[dict]) -> Iterator[str]:
+        yield (
+            f'{{"user": {json.dumps(self.user.username)}, '
+            f'"created": {json.dumps(self.created)}, "ingredients": ['
+        )
+        separator = ""
+
+        for ingredient in ingredients:
+            yield separator + json.dumps(
+                {
+                    "name": ingredient["name"],
+                    "amount": ingredient["amount"],
+                    "measurement_unit": ingredient["measurement"],
+                },
+                ensure_ascii=False,
+            )
+            separator = ", "
+
+        yield "]}"
+
+
+@register_formatter("pdf")
+class PdfFormatter(ShoppingListFormatter):
+    """Список покупок в формате PDF. Страницы рисуются по мере чтения
+       ингредиентов, готовый документ отдаётся одним блоком."""
+
+    extension = "pdf"
+    content_type = "application/pdf"
+    font_name = "ShoppingListFont"
+    font_size = 12
+    margin = 50
+
+    def _get_font(self) -> str:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        font_path = getattr(settings, "SHOPPING_LIST_PDF_FONT", None)
+        if not font_path or not Path(font_path).is_file():
+            return "Helvetica"
+
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(self.font_name, font_path))
+        return self.font_name
+
+    def render(self, ingredients: Iterable[dict]) -> Iterator[bytes]:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen.canvas import Canvas
+
+        buffer = BytesIO()
+        font = self._get_font()
+        _, height = A4
+        pdf = Canvas(buffer, pagesize=A4)
+        line_height = self.font_size * 1.5
+        text = None
+
+        lines = (
+            line
+            for chunk in TextFormatter(self.user).render(ingredients)
+            for line in chunk.splitlines()
+        )
+        for line in lines:
+            if text is None:
+                text = pdf.beginText(self.margin, height - self.margin)
+                text.setFont(font, self.font_size)
+                text.setLeading(line_height)
+
+            text.textLine(line)
+
+            if text.getY() < self.margin:
+                pdf.drawText(text)
+                pdf.showPage()
+                text = None
+
+        if text is not None:
+            pdf.drawText(text)
+        pdf.save()
+        yield buffer.getvalue()
@@ -0,0 +1,160 @@
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+from threading import Lock
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image
+
+from core.metrics import IMAGE_RENDITION_FAILURES
+
+PIL_FORMATS = {"jpeg": "JPEG", "webp": "WEBP", "avif": "AVIF"}
+EXTENSIONS = {"jpeg": "jpg", "webp": "webp", "avif": "avif"}
+
+logger = logging.getLogger("foodgram.images")
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = Lock()
+
+
+def supported_formats() -> list[str]:
+    """Форматы изображений из настроек, которые умеет сохранять Pillow."""
+    Image.init()
+    return [
+        image_format
+        for image_format in settings.RECIPE_IMAGE_FORMATS
+        if PIL_FORMATS[image_format] in Image.SAVE
+    ]
+
+
+def rendition_name(image_name: str, rendition: str, image_format: str) -> str:
+    """Путь файла с вариантом изображения в хранилище."""
+    path = PurePosixPath(image_name)
+    return str(
+        path.parent / "renditions"
+        / f"{path.stem}_{rendition}.{EXTENSIONS[image_format]}"
+    )
+
+
+def render_renditions(image_name: str) -> dict[str, dict[str, str]]:
+    """Сохраняет уменьшенные копии изображения во всех форматах.
+       Возвращает пути файлов вида {"thumbnail": {"jpeg": ...}}."""
+    with default_storage.open(image_name) as source:
+        original = Image.open(source)
+        original.load()
+
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA" if "A" in original.mode else "RGB")
+
+    renditions = {}
+    formats = supported_formats()
+
+    for rendition, size in settings.RECIPE_IMAGE_RENDITIONS.items():
+        image = original.copy()
+        image.thumbnail(size)
+        renditions[rendition] = {}
+
+        for image_format in formats:
+            frame = image
+            if image_format == "jpeg" and image.mode != "RGB":
+                frame = image.convert("RGB")
+
+            buffer = BytesIO()
+            frame.save(buffer, PIL_FORMATS[image_format], quality=85)
+            name = rendition_name(image_name, rendition, image_format)
+
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            renditions[rendition][image_format] = default_storage.save(
+                name, ContentFile(buffer.getvalue())
+            )
+
+    return renditions
+
+
+def delete_renditions(renditions: dict[str, dict[str, str]]) -> None:
+    """Удаляет файлы вариантов изображения."""
+    for formats in renditions.values():
+        for name in formats.values():
+            default_storage.delete(name)
+
+
+def delete_recipe_images(instance, **kwargs) -> None:
+    """Обработчик post_delete рецепта. Файлы удаляются только после
+       фиксации транзакции: при откате рецепт остаётся с картинкой."""
+    image_name = instance.image.name
+    renditions = instance.image_renditions
+
+    def delete() -> None:
+        if image_name:
+            default_storage.delete(image_name)
+        delete_renditions(renditions)
+
+    transaction.on_commit(delete)
+
+
+def process_recipe_image(recipe_id: int, image_name: str) -> None:
+    """Строит варианты изображения рецепта и сохраняет их пути.
+       Если пока шла обработка картинку заменили, результат
+       отбрасывается."""
+    Recipe = apps.get_model("recipes", "Recipe")
+    renditions = render_renditions(image_name)
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=image_name
+    ).update(image_renditions=renditions)
+
+    if not updated:
+        delete_renditions(renditions)
+
+
+def _process_logged(recipe_id: int, image_name: str) -> None:
+    """Обработка, ошибки которой пишутся в лог и метрики: результат
+       фоновой задачи никто не ждёт, и рецепт до следующей замены
+       картинки отдаёт оригинал."""
+    try:
+        process_recipe_image(recipe_id, image_name)
+    except Exception:
+        IMAGE_RENDITION_FAILURES.inc()
+        logger.exception(
+            "Не удалось построить варианты изображения %s рецепта %s",
+            image_name, recipe_id,
+        )
+
+
+def _process_in_worker(recipe_id: int, image_name: str) -> None:
+    """Запуск обработки в потоке пула со своим подключением к базе."""
+    close_old_connections()
+    try:
+        _process_logged(recipe_id, image_name)
+    finally:
+        close_old_connections()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PIPELINE_WORKERS,
+                thread_name_prefix="recipe-images",
+            )
+        return _executor
+
+
+def schedule_recipe_image(recipe_id: int, image_name: str) -> None:
+    """Ставит обработку изображения в очередь после фиксации транзакции.
+       При IMAGE_PIPELINE_SYNC обработка выполняется сразу."""
+
+    def submit() -> Future | None:
+        if settings.IMAGE_PIPELINE_SYNC:
+            return _process_logged(recipe_id, image_name)
+        return get_executor().submit(
+            _process_in_worker, recipe_id, image_name)
+
+    transaction.on_commit(submit)
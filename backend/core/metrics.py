@@ -0,0 +1,114 @@
+import os
+from hmac import compare_digest
+from ipaddress import ip_address, ip_network
+from time import perf_counter
+from typing import Callable
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse, HttpResponseForbidden
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+REQUEST_LATENCY = Histogram(
+    "foodgram_request_duration_seconds",
+    "Время обработки запроса.",
+    ("view", "method"),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUEST_QUERIES = Histogram(
+    "foodgram_request_db_queries",
+    "Число SQL-запросов на один запрос к API.",
+    ("view",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+CACHE_REQUESTS = Counter(
+    "foodgram_cache_requests",
+    "Обращения к кэшам ответов по результату: hit или miss.",
+    ("cache", "result"),
+)
+
+IMAGE_RENDITION_FAILURES = Counter(
+    "foodgram_image_rendition_failures",
+    "Ошибки построения уменьшенных вариантов изображений рецептов.",
+)
+
+
+def cache_hit(cache_name: str, hit: bool) -> None:
+    """Учитывает попадание или промах кэша."""
+    CACHE_REQUESTS.labels(cache_name, "hit" if hit else "miss").inc()
+
+
+class QueryCounter:
+    """Обёртка execute_wrapper, только считающая запросы."""
+
+    __slots__ = ("count",)
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Собирает гистограммы времени ответа и числа SQL-запросов по имени
+       маршрута. При METRICS_ENABLED=False ничего не делает."""
+
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        start = perf_counter()
+
+        with connections["default"].execute_wrapper(counter):
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+
+        REQUEST_LATENCY.labels(view, request.method).observe(
+            perf_counter() - start)
+        REQUEST_QUERIES.labels(view).observe(counter.count)
+        return response
+
+
+def metrics_allowed(request: HttpRequest) -> bool:
+    """Запрос пришёл из METRICS_ALLOWED_NETWORKS или с METRICS_TOKEN."""
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    if token and compare_digest(authorization, f"Bearer {token}"):
+        return True
+
+    try:
+        address = ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(
+        address in ip_network(network, strict=False)
+        for network in settings.METRICS_ALLOWED_NETWORKS
+    )
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """Метрики в текстовом формате Prometheus. Если задан
+       PROMETHEUS_MULTIPROC_DIR, значения собираются из файлов всех
+       воркеров gunicorn. Доступны только клиентам из
+       METRICS_ALLOWED_NETWORKS или с METRICS_TOKEN."""
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,20 @@
+from django.db.migrations import RunSQL
+
+
+class PostgresRunSQL(RunSQL):
+    """RunSQL, который выполняется только в PostgreSQL. В остальных
+       базах операция пропускается, как CreateExtension."""
+
+    def database_forwards(
+        self, app_label, schema_editor, from_state, to_state
+    ) -> None:
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(
+        self, app_label, schema_editor, from_state, to_state
+    ) -> None:
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state)
@@ -0,0 +1,198 @@
+from array import array
+from collections import Counter
+from heapq import heappush, heapreplace
+from threading import Lock, Thread
+from time import monotonic
+from typing import Iterable
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from core.cache import increment
+
+PANTRY_VERSION_KEY = "pantry_index_version"
+
+_index: "PantryIndex | None" = None
+_lock = Lock()
+
+
+class PantryIndex:
+    """Обратный индекс ингредиент → рецепты в памяти процесса. Рецепты
+       пронумерованы по возрастанию id, списки рецептов ингредиента
+       хранятся отсортированными массивами этих номеров, число
+       ингредиентов рецепта — в отдельном массиве по тому же номеру."""
+
+    __slots__ = (
+        "recipe_ids", "required", "min_required", "postings", "version",
+        "built",
+    )
+
+    def __init__(
+        self, rows: Iterable[tuple[int, int]], version: int | None
+    ) -> None:
+        """rows — пары (рецепт, ингредиент), упорядоченные по рецепту."""
+        self.recipe_ids = array("q")
+        self.required = array("H")
+        self.postings: dict[int, array] = {}
+
+        for recipe_id, ingredient_id in rows:
+            if not self.recipe_ids or self.recipe_ids[-1] != recipe_id:
+                self.recipe_ids.append(recipe_id)
+                self.required.append(0)
+
+            position = len(self.recipe_ids) - 1
+            self.required[position] += 1
+            postings = self.postings.get(ingredient_id)
+            if postings is None:
+                postings = self.postings[ingredient_id] = array("i")
+            postings.append(position)
+
+        self.min_required = min(self.required, default=1)
+        self.version = version
+        self.built = monotonic()
+
+    def __len__(self) -> int:
+        return len(self.recipe_ids)
+
+    def rank(self, ingredient_ids: Iterable[int]) -> "PantryMatches":
+        """Рецепты, в которых есть хотя бы один из ингредиентов."""
+        matched: Counter[int] = Counter()
+
+        for ingredient_id in set(ingredient_ids):
+            postings = self.postings.get(ingredient_id)
+            if postings is not None:
+                matched.update(postings)
+        return PantryMatches(self, matched)
+
+
+class PantryMatches:
+    """Результат поиска для пагинатора: элементы (id рецепта, найдено,
+       нужно). Сначала рецепты с наибольшей долей имеющихся
+       ингредиентов, при равной доле — с меньшим числом недостающих,
+       затем более новые. Число рецептов известно сразу, а упорядочивать
+       приходится только начало списка до конца запрошенного среза."""
+
+    def __init__(self, index: PantryIndex, matched: Counter) -> None:
+        self.index = index
+        self.matched = matched
+
+    def __len__(self) -> int:
+        return len(self.matched)
+
+    def __getitem__(self, item: slice) -> list[tuple[int, int, int]]:
+        start, stop, _ = item.indices(len(self))
+        return self.top(stop)[start:stop]
+
+    def top(self, size: int) -> list[tuple[int, int, int]]:
+        """Первые size рецептов. Рецепты перебираются по убыванию числа
+           найденных ингредиентов; перебор останавливается, когда доля
+           даже у самого короткого рецепта не может превзойти худшую из
+           уже отобранных."""
+        required = self.index.required
+        min_required = self.index.min_required
+        heap: list[tuple[float, int, int]] = []
+
+        if size <= 0:
+            return []
+
+        for position, count in self.matched.most_common():
+            if len(heap) == size and (
+                count / max(count, min_required) < heap[0][0]
+            ):
+                break
+
+            # Меньше недостающих — больше count - required.
+            entry = (
+                count / required[position],
+                count - required[position],
+                position,
+            )
+            if len(heap) < size:
+                heappush(heap, entry)
+            elif entry > heap[0]:
+                heapreplace(heap, entry)
+
+        ranked = []
+        for _, surplus, position in sorted(heap, reverse=True):
+            ranked.append(
+                (
+                    self.index.recipe_ids[position],
+                    required[position] + surplus,
+                    required[position],
+                )
+            )
+        return ranked
+
+
+def load_index(version: int | None) -> PantryIndex:
+    AmountIngredient = apps.get_model("recipes", "AmountIngredient")
+    return PantryIndex(
+        AmountIngredient.objects.order_by("recipe_id", "ingredients_id")
+        .values_list("recipe_id", "ingredients_id")
+        .iterator(chunk_size=10_000),
+        version,
+    )
+
+
+def _is_fresh(index: PantryIndex, version: int | None) -> bool:
+    age = monotonic() - index.built
+    if age >= settings.IN_MEMORY_INDEX_MAX_AGE:
+        return False
+    return index.version == version or age < settings.PANTRY_INDEX_REFRESH
+
+
+def _rebuild(version: int | None) -> None:
+    """Перестраивает индекс в фоновом потоке со своим подключением к
+       базе. Блокировка захвачена вызывающим и снимается здесь."""
+    global _index
+
+    close_old_connections()
+    try:
+        _index = load_index(version)
+    finally:
+        close_old_connections()
+        _lock.release()
+
+
+def get_pantry_index() -> PantryIndex:
+    """Возвращает индекс, перестраивая его, если версия в общем кэше
+       изменилась. Перестройка идёт не чаще раза в PANTRY_INDEX_REFRESH
+       секунд. Старше IN_MEMORY_INDEX_MAX_AGE секунд индекс
+       перестраивается и без смены версии: с LocMemCache другие воркеры
+       её не видят. Устаревший индекс перестраивается в фоновом потоке,
+       а запросы тем временем получают прежний; в запросе индекс
+       строится только при первом обращении к нему в процессе."""
+    global _index
+
+    version = cache.get(PANTRY_VERSION_KEY)
+    index = _index
+
+    if index is not None and _is_fresh(index, version):
+        return index
+
+    if not _lock.acquire(blocking=index is None):
+        return index
+
+    if _index is not None:
+        if _is_fresh(_index, version):
+            _lock.release()
+        else:
+            Thread(
+                target=_rebuild, args=(version,), name="pantry-index",
+                daemon=True,
+            ).start()
+        return _index
+
+    try:
+        _index = load_index(version)
+        return _index
+    finally:
+        _lock.release()
+
+
+def invalidate_pantry_index(**kwargs) -> None:
+    """Отмечает, что состав рецептов изменился, для всех процессов.
+       Подходит как обработчик сигнала post_delete рецепта."""
+    increment(PANTRY_VERSION_KEY)
@@ -0,0 +1,159 @@
+import json
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack
+from random import random
+from time import perf_counter
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+from core.cache import increment
+
+logger = logging.getLogger("foodgram.profiling")
+
+PROFILING_PREFIX = "profiling"
+PROFILING_VIEWS_KEY = f"{PROFILING_PREFIX}:views"
+PROFILING_COUNTERS = ("requests", "queries", "db_us", "total_us", "n_plus_1")
+
+_IN_LIST = re.compile(r"\((?:%s, )+%s\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(sql: str) -> str:
+    """Запрос без значений: списки IN и числа заменяются заглушками,
+       чтобы одинаковые по форме запросы совпадали."""
+    sql = _IN_LIST.sub("(...)", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+class QueryProfiler:
+    """Обёртка execute_wrapper, считающая запросы, время в базе и
+       повторы одинаковых запросов."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints: Counter[str] = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self, threshold: int) -> dict[str, int]:
+        """Запросы, повторённые не меньше threshold раз, — признак N+1."""
+        return {
+            sql: count
+            for sql, count in self.fingerprints.most_common()
+            if count >= threshold
+        }
+
+
+def record_view_stats(
+    view: str, total: float, profiler: QueryProfiler, duplicates: int
+) -> None:
+    """Добавляет замер запроса к накопленной статистике представления."""
+    views = cache.get(PROFILING_VIEWS_KEY) or set()
+    if view not in views:
+        cache.set(PROFILING_VIEWS_KEY, views | {view}, timeout=None)
+
+    values = {
+        "requests": 1,
+        "queries": profiler.count,
+        "db_us": int(profiler.duration * 1_000_000),
+        "total_us": int(total * 1_000_000),
+        "n_plus_1": int(bool(duplicates)),
+    }
+    for counter, delta in values.items():
+        increment(f"{PROFILING_PREFIX}:{view}:{counter}", delta)
+
+
+def view_stats() -> dict[str, dict[str, int]]:
+    """Накопленная статистика по представлениям."""
+    views = sorted(cache.get(PROFILING_VIEWS_KEY) or ())
+    keys = {
+        (view, counter): f"{PROFILING_PREFIX}:{view}:{counter}"
+        for view in views
+        for counter in PROFILING_COUNTERS
+    }
+    values = cache.get_many(keys.values())
+    stats = {}
+
+    for (view, counter), key in keys.items():
+        stats.setdefault(view, {})[counter] = values.get(key, 0)
+    return stats
+
+
+def reset_view_stats() -> None:
+    views = cache.get(PROFILING_VIEWS_KEY) or ()
+    cache.delete_many(
+        [
+            f"{PROFILING_PREFIX}:{view}:{counter}"
+            for view in views
+            for counter in PROFILING_COUNTERS
+        ]
+        + [PROFILING_VIEWS_KEY]
+    )
+
+
+class ProfilingMiddleware:
+    """Замеряет долю запросов, заданную PROFILING_SAMPLE_RATE: число SQL,
+       время в базе и повторяющиеся запросы. Результат уходит в
+       заголовок Server-Timing, в лог foodgram.profiling одной строкой
+       JSON и в статистику по представлениям."""
+
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate <= 0 or random() >= rate:
+            return self.get_response(request)
+
+        profiler = QueryProfiler()
+        start = perf_counter()
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profiler))
+            response = self.get_response(request)
+
+        total = perf_counter() - start
+        duplicates = profiler.duplicates(
+            settings.PROFILING_DUPLICATE_THRESHOLD)
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+
+        response["Server-Timing"] = (
+            f'db;dur={profiler.duration * 1000:.2f};'
+            f'desc="{profiler.count} queries", '
+            f"total;dur={total * 1000:.2f}"
+        )
+        logger.info(
+            json.dumps(
+                {
+                    "method": request.method,
+                    "path": request.path,
+                    "view": view,
+                    "status": response.status_code,
+                    "total_ms": round(total * 1000, 2),
+                    "db_ms": round(profiler.duration * 1000, 2),
+                    "queries": profiler.count,
+                    "duplicates": duplicates,
+                },
+                ensure_ascii=False,
+            )
+        )
+        record_view_stats(view, total, profiler, len(duplicates))
+        return response
@@ -0,0 +1,329 @@
+from array import array
+from collections import Counter
+from heapq import heapify, heapreplace, merge, nlargest
+from math import sqrt
+from typing import Iterable, Iterator
+
+from django.apps import apps
+from django.conf import settings
+
+
+def ingredient_feature(ingredient_id: int) -> int:
+    return ingredient_id * 2
+
+
+def tag_feature(tag_id: int) -> int:
+    return tag_id * 2 + 1
+
+
+class SimilarityIndex:
+    """Бинарные векторы рецептов по ингредиентам и тегам. Векторы
+       хранятся построчно, как разреженная матрица CSR: номера признаков
+       всех рецептов подряд в features, начало строки рецепта — в
+       offsets. Обратный индекс признак → рецепты даёт кандидатов в
+       похожие без перебора всех пар."""
+
+    __slots__ = ("recipe_ids", "positions", "offsets", "features",
+                 "postings", "inverse_norms", "max_inverse_norm")
+
+    def __init__(self, rows: Iterable[tuple[int, int]]) -> None:
+        """rows — пары (рецепт, признак), упорядоченные по рецепту."""
+        self.recipe_ids = array("q")
+        self.offsets = array("l", (0,))
+        self.features = array("l")
+        self.postings: dict[int, array] = {}
+
+        for recipe_id, feature in rows:
+            if not self.recipe_ids or self.recipe_ids[-1] != recipe_id:
+                if self.recipe_ids:
+                    self.offsets.append(len(self.features))
+                self.recipe_ids.append(recipe_id)
+
+            self.features.append(feature)
+            postings = self.postings.get(feature)
+            if postings is None:
+                postings = self.postings[feature] = array("i")
+            postings.append(len(self.recipe_ids) - 1)
+
+        if self.recipe_ids:
+            self.offsets.append(len(self.features))
+        self.positions = {
+            recipe_id: position
+            for position, recipe_id in enumerate(self.recipe_ids)
+        }
+        self.inverse_norms = array(
+            "d",
+            (
+                1 / sqrt(end - start)
+                for start, end in zip(self.offsets, self.offsets[1:])
+            ),
+        )
+        self.max_inverse_norm = max(self.inverse_norms, default=1)
+
+    def __len__(self) -> int:
+        return len(self.recipe_ids)
+
+    def row(self, position: int) -> array:
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return self.features[start:end]
+
+    def neighbors(
+        self, recipe_id: int, size: int, max_postings: int
+    ) -> list[tuple[int, float]]:
+        """size рецептов с наибольшей косинусной близостью. Кандидаты
+           берутся из списков признаков не длиннее max_postings; частые
+           признаки вроде тегов только уточняют оценку уже найденных
+           кандидатов, иначе каждый рецепт сравнивался бы с большей
+           частью базы."""
+        position = self.positions.get(recipe_id)
+        if position is None:
+            return []
+
+        row = self.row(position)
+        rare, common = [], set()
+        for feature in row:
+            if len(self.postings[feature]) <= max_postings:
+                rare.append(self.postings[feature])
+            else:
+                common.add(feature)
+
+        if not rare and common:
+            rarest = min(common, key=lambda item: len(self.postings[item]))
+            rare.append(self.postings[rarest][:max_postings])
+            common.discard(rarest)
+
+        shared: Counter[int] = Counter()
+        for postings in rare:
+            shared.update(postings)
+        shared.pop(position, None)
+
+        # Кандидаты по близости без учёта частых признаков. Перебор по
+        # убыванию числа общих признаков останавливается, когда даже
+        # самый короткий рецепт не превзойдёт худшего из отобранных.
+        inverse_norms = self.inverse_norms
+        max_inverse_norm = self.max_inverse_norm
+        ranked = shared.most_common()
+        pool = [
+            (count * inverse_norms[candidate], candidate, count)
+            for candidate, count in ranked[:size * 4]
+        ]
+        heapify(pool)
+
+        for candidate, count in ranked[size * 4:]:
+            if count * max_inverse_norm < pool[0][0]:
+                break
+            score = count * inverse_norms[candidate]
+            if score > pool[0][0]:
+                heapreplace(pool, (score, candidate, count))
+
+        scored = []
+        for _, candidate, count in pool:
+            other = self.row(candidate)
+            if common:
+                count += len(common.intersection(other))
+            scored.append(
+                (
+                    round(count / sqrt(len(row) * len(other)), 4),
+                    self.recipe_ids[candidate],
+                )
+            )
+
+        return [
+            (recipe_id, score)
+            for score, recipe_id in nlargest(size, scored)
+        ]
+
+
+def feature_rows() -> Iterator[tuple[int, int]]:
+    """Пары (рецепт, признак) из базы, упорядоченные по рецепту."""
+    AmountIngredient = apps.get_model("recipes", "AmountIngredient")
+    RecipeTag = apps.get_model("recipes", "RecipeTag")
+
+    ingredients = (
+        (recipe_id, ingredient_feature(ingredient_id))
+        for recipe_id, ingredient_id in AmountIngredient.objects.order_by(
+            "recipe_id", "ingredients_id"
+        )
+        .values_list("recipe_id", "ingredients_id")
+        .iterator(chunk_size=10_000)
+    )
+    tags = (
+        (recipe_id, tag_feature(tag_id))
+        for recipe_id, tag_id in RecipeTag.objects.order_by(
+            "recipe_id", "tag_id"
+        )
+        .values_list("recipe_id", "tag_id")
+        .iterator(chunk_size=10_000)
+    )
+    return merge(ingredients, tags)
+
+
+def load_similarity_index() -> SimilarityIndex:
+    return SimilarityIndex(feature_rows())
+
+
+def save_neighbors(
+    index: SimilarityIndex, recipe_ids: Iterable[int], batch_size: int = 1000
+) -> int:
+    """Пересчитывает похожие рецепты и записывает их пачками по
+       batch_size. Возвращает число записанных рецептов."""
+    RecipeNeighbors = apps.get_model("recipes", "RecipeNeighbors")
+    size = settings.RECOMMENDATIONS_NEIGHBORS
+    max_postings = settings.RECOMMENDATIONS_MAX_POSTINGS
+    recipe_ids = list(recipe_ids)
+
+    for start in range(0, len(recipe_ids), batch_size):
+        rows = []
+        for recipe_id in recipe_ids[start:start + batch_size]:
+            neighbors = index.neighbors(recipe_id, size, max_postings)
+            rows.append(
+                RecipeNeighbors(
+                    recipe_id=recipe_id,
+                    neighbor_ids=[pk for pk, _ in neighbors],
+                    scores=[score for _, score in neighbors],
+                    stale=False,
+                )
+            )
+
+        RecipeNeighbors.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=("recipe",),
+            update_fields=("neighbor_ids", "scores", "stale", "updated"),
+        )
+    return len(recipe_ids)
+
+
+def drop_missing(index: SimilarityIndex, recipe_ids: Iterable[int]) -> None:
+    """Удаляет строки рецептов, у которых не осталось ингредиентов и
+       тегов."""
+    RecipeNeighbors = apps.get_model("recipes", "RecipeNeighbors")
+    missing = [pk for pk in recipe_ids if pk not in index.positions]
+    if missing:
+        RecipeNeighbors.objects.filter(recipe_id__in=missing).delete()
+
+
+def build_neighbors(index: SimilarityIndex, batch_size: int = 1000) -> int:
+    """Полный пересчёт похожих рецептов для всех рецептов."""
+    RecipeNeighbors = apps.get_model("recipes", "RecipeNeighbors")
+    drop_missing(
+        index,
+        RecipeNeighbors.objects.values_list("recipe_id", flat=True).iterator(
+            chunk_size=10_000),
+    )
+    return save_neighbors(index, index.recipe_ids, batch_size)
+
+
+def refresh_neighbors(index: SimilarityIndex, batch_size: int = 1000) -> int:
+    """Пересчитывает только изменившиеся рецепты: отмеченные stale и
+       ещё не посчитанные, а также их прежних соседей и рецепты, для
+       которых изменившийся рецепт теперь ближе последнего в списке.
+       Близость симметрична, поэтому этого почти всегда достаточно;
+       остальные списки поправит полный пересчёт."""
+    RecipeNeighbors = apps.get_model("recipes", "RecipeNeighbors")
+    size = settings.RECOMMENDATIONS_NEIGHBORS
+    max_postings = settings.RECOMMENDATIONS_MAX_POSTINGS
+
+    stale = dict(
+        RecipeNeighbors.objects.filter(stale=True).values_list(
+            "recipe_id", "neighbor_ids")
+    )
+    drop_missing(index, list(stale))
+    stored = set(
+        RecipeNeighbors.objects.values_list("recipe_id", flat=True).iterator(
+            chunk_size=10_000)
+    )
+    changed = [
+        recipe_id
+        for recipe_id in index.recipe_ids
+        if recipe_id in stale or recipe_id not in stored
+    ]
+    affected = set(changed)
+    candidates: dict[int, float] = {}
+
+    for recipe_id in changed:
+        affected.update(stale.get(recipe_id, ()))
+        for pk, score in index.neighbors(recipe_id, size, max_postings):
+            candidates[pk] = max(score, candidates.get(pk, 0))
+
+    candidate_ids = list(candidates.keys() - affected)
+    for start in range(0, len(candidate_ids), batch_size):
+        for pk, scores in RecipeNeighbors.objects.filter(
+            recipe_id__in=candidate_ids[start:start + batch_size]
+        ).values_list("recipe_id", "scores"):
+            if len(scores) < size or candidates[pk] > scores[-1]:
+                affected.add(pk)
+
+    affected.intersection_update(index.positions)
+    return save_neighbors(index, sorted(affected), batch_size)
+
+
+def mark_recipes_changed(recipe_ids: Iterable[int]) -> None:
+    """Отмечает, что похожие рецепты нужно пересчитать."""
+    RecipeNeighbors = apps.get_model("recipes", "RecipeNeighbors")
+    RecipeNeighbors.objects.filter(recipe_id__in=recipe_ids).update(
+        stale=True)
+
+
+def recipe_deleted(instance, **kwargs) -> None:
+    """Отмечает соседей удаляемого рецепта. Обработчик pre_delete."""
+    RecipeNeighbors = apps.get_model("recipes", "RecipeNeighbors")
+    neighbor_ids = (
+        RecipeNeighbors.objects.filter(recipe_id=instance.pk)
+        .values_list("neighbor_ids", flat=True)
+        .first()
+    )
+    if neighbor_ids:
+        mark_recipes_changed(neighbor_ids)
+
+
+def similar_recipe_ids(recipe_id: int, limit: int) -> list[int] | None:
+    """Похожие рецепты из заранее посчитанной таблицы. None, если
+       рецепт ещё не посчитан."""
+    RecipeNeighbors = apps.get_model("recipes", "RecipeNeighbors")
+    neighbor_ids = (
+        RecipeNeighbors.objects.filter(recipe_id=recipe_id)
+        .values_list("neighbor_ids", flat=True)
+        .first()
+    )
+    return None if neighbor_ids is None else neighbor_ids[:limit]
+
+
+def recommended_recipe_ids(user_id: int, limit: int) -> list[int]:
+    """Рекомендации по последним RECOMMENDATIONS_FAVORITES рецептам из
+       избранного: близость соседей суммируется по всем избранным
+       рецептам, сами избранные рецепты исключаются. Если избранного
+       нет, рекомендуются популярные рецепты."""
+    Favorites = apps.get_model("recipes", "Favorites")
+    Recipe = apps.get_model("recipes", "Recipe")
+    RecipeNeighbors = apps.get_model("recipes", "RecipeNeighbors")
+
+    favorites = list(
+        Favorites.objects.filter(user_id=user_id)
+        .order_by("-date_added")
+        .values_list("recipe_id", flat=True)[
+            :settings.RECOMMENDATIONS_FAVORITES]
+    )
+    scores: Counter[int] = Counter()
+
+    for neighbor_ids, weights in RecipeNeighbors.objects.filter(
+        recipe_id__in=favorites
+    ).values_list("neighbor_ids", "scores"):
+        for pk, score in zip(neighbor_ids, weights):
+            scores[pk] += score
+
+    if scores:
+        favorited = set(
+            Favorites.objects.filter(
+                user_id=user_id, recipe_id__in=list(scores)
+            ).values_list("recipe_id", flat=True)
+        )
+        return [
+            pk for pk, _ in scores.most_common() if pk not in favorited
+        ][:limit]
+
+    return list(
+        Recipe.objects.exclude(in_favorites__user_id=user_id)
+        .order_by("-favorites_count", "-pub_date", "-id")
+        .values_list("pk", flat=True)[:limit]
+    )
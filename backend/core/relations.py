@@ -0,0 +1,93 @@
+from typing import Iterable
+
+from django.db.models import Model
+from django.http import HttpRequest
+
+# Модели связей текущего пользователя и поле объекта связи.
+RELATION_FIELDS = {
+    "recipes.Favorites": "recipe_id",
+    "recipes.Carts": "recipe_id",
+    "users.Subscriptions": "author_id",
+}
+
+
+class RelationContext:
+    """Избранное, корзина и подписки текущего пользователя на время
+       одного запроса. Связи загружаются только для объектов, которые
+       выводятся, по одному запросу на модель связи; повторные проверки
+       берутся из памяти. Для анонимного пользователя запросов нет."""
+
+    __slots__ = ("user_id", "present", "known")
+
+    def __init__(self, user_id: int | None) -> None:
+        self.user_id = user_id
+        self.present: dict[type[Model], set[int]] = {}
+        self.known: dict[type[Model], set[int]] = {}
+
+    def _sets(self, model: type[Model]) -> tuple[set[int], set[int]]:
+        return (
+            self.present.setdefault(model, set()),
+            self.known.setdefault(model, set()),
+        )
+
+    def load(self, model: type[Model], ids: Iterable[int]) -> None:
+        """Загружает связи с объектами, которые ещё не проверялись."""
+        if self.user_id is None:
+            return
+
+        present, known = self._sets(model)
+        ids = set(ids) - known
+        if not ids:
+            return
+
+        field = RELATION_FIELDS[model._meta.label]
+        present.update(
+            model.objects.filter(
+                user_id=self.user_id, **{f"{field}__in": ids}
+            ).values_list(field, flat=True)
+        )
+        known.update(ids)
+
+    def contains(self, model: type[Model], pk: int) -> bool:
+        if self.user_id is None:
+            return False
+
+        self.load(model, (pk,))
+        return pk in self.present[model]
+
+    def assume(self, model: type[Model], pk: int, value: bool) -> None:
+        """Запоминает уже известный флаг, например из аннотации
+           выборки, если связь в этом запросе ещё не проверялась."""
+        if pk not in self._sets(model)[1]:
+            self.remember(model, (pk,), value)
+
+    def remember(
+        self, model: type[Model], ids: Iterable[int], value: bool
+    ) -> None:
+        """Записывает результат изменения связей в этом запросе."""
+        present, known = self._sets(model)
+        ids = set(ids)
+        known.update(ids)
+
+        if value:
+            present.update(ids)
+        else:
+            present.difference_update(ids)
+
+    def remember_relation(self, relation: Model, value: bool) -> None:
+        field = RELATION_FIELDS[relation._meta.label]
+        self.remember(type(relation), (getattr(relation, field),), value)
+
+
+def get_relations(request: HttpRequest | None) -> RelationContext:
+    """Контекст связей, общий для всех сериализаторов запроса."""
+    if request is None:
+        return RelationContext(None)
+
+    relations = getattr(request, "_relations", None)
+    if relations is None:
+        user = request.user
+        relations = RelationContext(
+            user.pk if user.is_authenticated else None)
+        request._relations = relations
+    return relations
@@ -0,0 +1,293 @@
+import re
+from bisect import bisect_left
+from threading import Lock
+from time import monotonic
+from typing import Iterable
+from urllib.parse import unquote
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import (Case, F, IntegerField, Q, QuerySet, Value,
+                              When)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Upper
+
+from core.cache import increment
+from core.services import maybe_incorrect_layout
+
+# Конфигурации полнотекстового поиска рецептов в PostgreSQL, столбец
+# search_vector создаёт миграция recipes 0006.
+RECIPE_SEARCH_CONFIGS = ("russian", "english")
+RECIPE_SEARCH_VERSION_KEY = "recipe_search_version"
+RECIPE_SEARCH_FIELDS = frozenset(("name", "text"))
+# Вес совпадения в названии относительно совпадения в описании.
+RECIPE_NAME_WEIGHT = 4
+
+_TOKEN = re.compile(r"\w+")
+_recipe_index: "RecipeSearchIndex | None" = None
+_recipe_index_lock = Lock()
+
+
+def normalize_name(name: str) -> str:
+    """Приводит название к виду, по которому ведётся поиск."""
+    return name.strip().casefold().replace("ё", "е")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(normalize_name(text))
+
+
+def name_candidates(value: str) -> list[str]:
+    """Варианты поискового запроса: введённый текст и он же
+       в русской раскладке, если пользователь её не переключил."""
+    value = unquote(value).strip().lower()
+    candidates = [value]
+    corrected = maybe_incorrect_layout(value)
+
+    if corrected and corrected != value:
+        candidates.append(corrected)
+    return candidates
+
+
+class IngredientSearch:
+    """Поиск ингредиентов по названию. Сначала совпадения по началу
+       названия, затем по вхождению; вариант в другой раскладке идёт
+       после введённого текста. Без pg_trgm в PostgreSQL ищется только
+       начало названия, чтобы запрос шёл по префиксному индексу."""
+
+    match_contains = True
+
+    def rank(self, candidates: list[str]) -> Case:
+        whens = []
+
+        for position, candidate in enumerate(candidates):
+            whens.append(
+                When(name__istartswith=candidate, then=Value(position * 2)))
+            whens.append(
+                When(name__icontains=candidate, then=Value(position * 2 + 1)))
+
+        return Case(
+            *whens,
+            default=Value(len(candidates) * 2),
+            output_field=IntegerField(),
+        )
+
+    def condition(self, candidates: list[str]) -> Q:
+        lookup = "name__icontains" if self.match_contains else (
+            "name__istartswith")
+        condition = Q()
+
+        for candidate in candidates:
+            condition |= Q(**{lookup: candidate})
+        return condition
+
+    def search(self, queryset: QuerySet, value: str) -> QuerySet:
+        candidates = name_candidates(value)
+
+        if not candidates[0]:
+            return queryset
+
+        return (
+            queryset.filter(self.condition(candidates))
+            .annotate(search_rank=self.rank(candidates))
+            .order_by("search_rank", "name")
+        )
+
+
+class TrigramIngredientSearch(IngredientSearch):
+    """Поиск с pg_trgm: к вхождениям добавляются похожие названия,
+       отсортированные по степени сходства."""
+
+    def condition(self, candidates: list[str]) -> Q:
+        from django.contrib.postgres.lookups import TrigramSimilar
+
+        condition = super().condition(candidates)
+
+        for candidate in candidates:
+            condition |= Q(
+                TrigramSimilar(Upper("name"), Value(candidate.upper())))
+        return condition
+
+    def search(self, queryset: QuerySet, value: str) -> QuerySet:
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        queryset = super().search(queryset, value)
+        candidates = name_candidates(value)
+
+        if not candidates[0]:
+            return queryset
+
+        return queryset.annotate(
+            similarity=TrigramSimilarity(
+                Upper("name"), Value(candidates[0].upper()))
+        ).order_by("search_rank", "-similarity", "name")
+
+
+class PrefixIngredientSearch(IngredientSearch):
+    """Поиск только по началу названия."""
+
+    match_contains = False
+
+
+def get_ingredient_search() -> IngredientSearch:
+    """Выбирает реализацию поиска под текущую базу данных."""
+    if connection.vendor != "postgresql":
+        return IngredientSearch()
+    if settings.INGREDIENT_SEARCH_TRIGRAM:
+        return TrigramIngredientSearch()
+    return PrefixIngredientSearch()
+
+
+class RecipeSearchIndex:
+    """Обратный индекс рецептов в памяти процесса: слово → рецепты и
+       вес совпадения. Слово запроса ищется как начало слов индекса,
+       рецепт должен содержать все слова запроса."""
+
+    __slots__ = ("terms", "postings", "version", "built")
+
+    def __init__(
+        self, rows: Iterable[tuple[int, str, str]], version: int | None
+    ) -> None:
+        postings: dict[str, dict[int, int]] = {}
+
+        for pk, name, text in rows:
+            for weight, value in ((RECIPE_NAME_WEIGHT, name), (1, text)):
+                for term in tokenize(value or ""):
+                    recipes = postings.setdefault(term, {})
+                    recipes[pk] = recipes.get(pk, 0) + weight
+
+        self.terms = sorted(postings)
+        self.postings = postings
+        self.version = version
+        self.built = monotonic()
+
+    def match(self, token: str) -> dict[int, int]:
+        found: dict[int, int] = {}
+        position = bisect_left(self.terms, token)
+
+        while (
+            position < len(self.terms)
+            and self.terms[position].startswith(token)
+        ):
+            for pk, weight in self.postings[self.terms[position]].items():
+                found[pk] = found.get(pk, 0) + weight
+            position += 1
+        return found
+
+    def search(self, value: str) -> dict[int, int]:
+        """Рецепты, подходящие под запрос, и их вес."""
+        scores: dict[int, int] | None = None
+
+        for token in dict.fromkeys(tokenize(value)):
+            found = self.match(token)
+            if scores is None:
+                scores = found
+            else:
+                scores = {
+                    pk: score + found[pk]
+                    for pk, score in scores.items() if pk in found
+                }
+            if not scores:
+                break
+        return scores or {}
+
+
+def _is_fresh(index: RecipeSearchIndex, version: int | None) -> bool:
+    return (
+        index.version == version
+        and monotonic() - index.built < settings.IN_MEMORY_INDEX_MAX_AGE
+    )
+
+
+def get_recipe_index() -> RecipeSearchIndex:
+    """Возвращает актуальный индекс, перестраивая его, если версия
+       в общем кэше изменилась или индекс старше
+       IN_MEMORY_INDEX_MAX_AGE секунд."""
+    global _recipe_index
+
+    version = cache.get(RECIPE_SEARCH_VERSION_KEY)
+    index = _recipe_index
+
+    if index is not None and _is_fresh(index, version):
+        return index
+
+    with _recipe_index_lock:
+        if _recipe_index is None or not _is_fresh(_recipe_index, version):
+            Recipe = apps.get_model("recipes", "Recipe")
+            _recipe_index = RecipeSearchIndex(
+                Recipe.objects.values_list("id", "name", "text").iterator(),
+                version,
+            )
+        return _recipe_index
+
+
+def invalidate_recipe_search(update_fields=None, **kwargs) -> None:
+    """Обработчик сигналов post_save/post_delete рецепта. Сбрасывает
+       обратный индекс, если менялись название или описание."""
+    global _recipe_index
+
+    if update_fields and RECIPE_SEARCH_FIELDS.isdisjoint(update_fields):
+        return
+
+    increment(RECIPE_SEARCH_VERSION_KEY)
+    _recipe_index = None
+
+
+class RecipeSearch:
+    """Поиск рецептов по обратному индексу в памяти для баз без
+       полнотекстового поиска. Результаты упорядочены по весу
+       совпадений."""
+
+    def search(self, queryset: QuerySet, value: str) -> QuerySet:
+        scores = get_recipe_index().search(value)
+        groups: dict[int, list[int]] = {}
+
+        for pk, score in scores.items():
+            groups.setdefault(score, []).append(pk)
+
+        return queryset.filter(pk__in=scores).annotate(
+            search_rank=Case(
+                *(
+                    When(pk__in=ids, then=Value(score))
+                    for score, ids in groups.items()
+                ),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        ).order_by("-search_rank", "-pub_date", "-id")
+
+
+class PostgresRecipeSearch(RecipeSearch):
+    """Полнотекстовый поиск по столбцу search_vector с GIN-индексом.
+       Запрос разбирается в русской и английской конфигурациях,
+       результаты упорядочены по ts_rank."""
+
+    def search(self, queryset: QuerySet, value: str) -> QuerySet:
+        from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                    SearchVectorField)
+
+        query = None
+        for config in RECIPE_SEARCH_CONFIGS:
+            config_query = SearchQuery(
+                value, config=config, search_type="websearch")
+            query = config_query if query is None else query | config_query
+
+        vector = RawSQL(
+            f'"{queryset.model._meta.db_table}"."search_vector"',
+            [],
+            output_field=SearchVectorField(),
+        )
+        return (
+            queryset.alias(search_vector=vector)
+            .filter(search_vector=query)
+            .annotate(search_rank=SearchRank(F("search_vector"), query))
+            .order_by("-search_rank", "-pub_date", "-id")
+        )
+
+
+def get_recipe_search() -> RecipeSearch:
+    if connection.vendor == "postgresql":
+        return PostgresRecipeSearch()
+    return RecipeSearch()
@@ -1,54 +1,173 @@
-from datetime import datetime as dt
-from typing import TYPE_CHECKING
+from hashlib import md5
+from typing import TYPE_CHECKING, Iterator
 from urllib.parse import unquote
 
 from django.apps import apps
-from django.db.models import F, Sum
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
 
-from foodgram.settings import DATE_TIME_FORMAT
-from recipes.models import AmountIngredient, Recipe
+from core.cache import invalidate_author_feeds
+from core.counters import change_counter
+from core.exporters import TextFormatter
+from core.pantry import invalidate_pantry_index
+from core.recommendations import mark_recipes_changed
+from recipes.models import (AmountIngredient, Recipe, RecipeTag,
+                            ShoppingListItem)
 
 if TYPE_CHECKING:
-    from recipes.models import Ingredient
     from users.models import NewUser
 
+# Строк списка покупок в одной пачке курсора: память на выгрузку
+# ограничена пачкой и не зависит от размера корзины.
+SHOPPING_LIST_CHUNK_SIZE = 200
+
 
 def recipe_ingredients_set(
-    recipe: Recipe, ingredients: dict[int, tuple["Ingredient", int]]
+    recipe: Recipe, ingredients: dict[int, int]
 ) -> None:
     """Записывает ингредиенты вложенные в рецепт."""
     objs = []
 
-    for ingredient, amount in ingredients.values():
+    for ingredient_id, amount in ingredients.items():
         objs.append(
             AmountIngredient(
-                recipe=recipe, ingredients=ingredient, amount=amount
+                recipe=recipe, ingredients_id=ingredient_id, amount=amount
             )
         )
 
     AmountIngredient.objects.bulk_create(objs)
+    invalidate_pantry_index()
 
 
-def create_shoping_list(user: "NewUser") -> str:
-    """Сфомировать список ингридкетов для покупки."""
-    shopping_list = [
-        f"Список покупок для:\n\n{user.first_name}\n"
-        f"{dt.now().strftime(DATE_TIME_FORMAT)}\n"
+def recipe_ingredients_update(
+    recipe: Recipe, ingredients: dict[int, int]
+) -> tuple[dict[int, int], dict[int, int]]:
+    """Приводит ингредиенты рецепта к новому составу, записывая только
+       изменившиеся строки. Возвращает прежнее и новое количество
+       каждого ингредиента."""
+    current = {
+        item.ingredients_id: item
+        for item in AmountIngredient.objects.filter(recipe=recipe)
+    }
+    old_amounts = {pk: item.amount for pk, item in current.items()}
+    new_amounts = dict(ingredients)
+
+    to_create, to_update = [], []
+    for pk, amount in new_amounts.items():
+        item = current.get(pk)
+
+        if item is None:
+            to_create.append(
+                AmountIngredient(
+                    recipe=recipe, ingredients_id=pk, amount=amount)
+            )
+        elif item.amount != amount:
+            item.amount = amount
+            to_update.append(item)
+
+    to_delete = [
+        item.pk for pk, item in current.items() if pk not in new_amounts
     ]
-    Ingredient = apps.get_model("recipes", "Ingredient")
+
+    if to_delete:
+        AmountIngredient.objects.filter(pk__in=to_delete).delete()
+    if to_update:
+        AmountIngredient.objects.bulk_update(to_update, ("amount",))
+    if to_create:
+        AmountIngredient.objects.bulk_create(to_create)
+    if to_delete or to_create:
+        invalidate_pantry_index()
+        mark_recipes_changed((recipe.pk,))
+
+    return old_amounts, new_amounts
+
+
+def recipe_tags_update(recipe: Recipe, tags: list[int]) -> None:
+    """Приводит теги рецепта к новому набору, добавляя и удаляя только
+       отличающиеся связи."""
+    current = set(
+        RecipeTag.objects.filter(recipe=recipe).values_list(
+            "tag_id", flat=True)
+    )
+    new = set(tags)
+
+    if current - new:
+        RecipeTag.objects.filter(
+            recipe=recipe, tag_id__in=current - new).delete()
+    if new - current:
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=pk) for pk in new - current
+        )
+    if current != new:
+        mark_recipes_changed((recipe.pk,))
+
+
+def before_recipe_delete(instance: Recipe, **kwargs) -> None:
+    """Обработчик pre_delete рецепта, в том числе при удалении выборкой
+       и через админку: убирает рецепт из сводных списков покупок, пока
+       его ингредиенты и корзины ещё в базе."""
+    ShoppingListItem.objects.discard_recipe(instance)
+
+
+def after_recipe_delete(instance: Recipe, **kwargs) -> None:
+    """Обработчик post_delete рецепта: уменьшает счётчик рецептов
+       автора и сбрасывает ленты его подписчиков."""
+    author_id = instance.author_id
+    if author_id is None:
+        return
+
+    change_counter(get_user_model(), "recipes_count", [author_id], -1)
+    transaction.on_commit(lambda: invalidate_author_feeds(author_id))
+
+
+def shopping_list_ingredients(
+    user: "NewUser", chunk_size: int = SHOPPING_LIST_CHUNK_SIZE
+) -> Iterator[dict]:
+    """Построчно отдаёт суммарное количество ингредиентов из сводного
+       списка покупок, читая результат курсором на стороне сервера."""
+    ShoppingListItem = apps.get_model("recipes", "ShoppingListItem")
     ingredients = (
-        Ingredient.objects.filter(recipe__recipe__in_carts__user=user)
-        .values("name", measurement=F("measurement_unit"))
-        .annotate(amount=Sum("recipe__amount"))
+        ShoppingListItem.objects.filter(user=user)
+        .values(
+            name=F("ingredient__name"),
+            measurement=F("ingredient__measurement_unit"),
+            amount=F("total_amount"),
+        )
+        .order_by("ingredient__name")
     )
-    ing_list = (
-        f'{ing["name"]}: {ing["amount"]} {ing["measurement"]}'
-        for ing in ingredients
+    return ingredients.iterator(chunk_size=chunk_size)
+
+
+def shopping_list_etag(user: "NewUser", file_format: str) -> str | None:
+    """ETag списка покупок: хэш строк сводного списка с названиями и
+       единицами измерения ингредиентов, так что он меняется вместе с
+       содержимым файла. Возвращает None, если список пуст."""
+    ShoppingListItem = apps.get_model("recipes", "ShoppingListItem")
+    rows = (
+        ShoppingListItem.objects.filter(user=user)
+        .values_list(
+            "ingredient_id", "ingredient__name",
+            "ingredient__measurement_unit", "total_amount",
+        )
+        .order_by("ingredient_id")
+    )
+    etag = md5(
+        f"{user.pk}:{file_format}:{user.username}:{user.first_name}".encode()
     )
-    shopping_list.extend(ing_list)
+    empty = True
+
+    for row in rows.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE):
+        etag.update(repr(row).encode())
+        empty = False
+    return None if empty else etag.hexdigest()
+
 
-    shopping_list.append("\nПосчитано в Foodgram")
-    return "\n".join(shopping_list)
+def create_shoping_list(user: "NewUser") -> str:
+    """Сфомировать список ингридкетов для покупки."""
+    return "".join(
+        TextFormatter(user).render(shopping_list_ingredients(user))
+    )
 
 
 def maybe_incorrect_layout(url_string: str) -> str:
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework.authtoken",
     "djoser",
@@ -50,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.metrics.MetricsMiddleware",
+    "core.profiling.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -86,6 +89,108 @@ DATABASES = {
     }
 }
 
+# Версии для сброса кэша ответов, лент и индексов хранятся в кэше,
+# поэтому при нескольких воркерах gunicorn он должен быть общим (Redis,
+# Memcached). LocMemCache у каждого воркера свой: сброс в одном воркере
+# не виден остальным, и с ним ответы кэшируются ненадолго.
+CACHE_BACKEND = config(
+    "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+)
+CACHE_IS_LOCAL = CACHE_BACKEND.endswith(".LocMemCache")
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": config("CACHE_LOCATION", default="foodgram"),
+    }
+}
+
+# Индексы в памяти процесса перестраиваются не реже раза в столько
+# секунд, даже если их версия в кэше не менялась.
+IN_MEMORY_INDEX_MAX_AGE = config(
+    "IN_MEMORY_INDEX_MAX_AGE", default=60 if CACHE_IS_LOCAL else 60 * 60,
+    cast=int,
+)
+
+# Время жизни закэшированных ответов тегов и ингредиентов, секунды.
+RESPONSE_CACHE_TIMEOUT = config(
+    "RESPONSE_CACHE_TIMEOUT", default=60 if CACHE_IS_LOCAL else 60 * 60,
+    cast=int,
+)
+
+# Попадания и промахи кэша ответов копятся в воркере и записываются в
+# кэш пачками по столько ответов (для manage.py cache_stats).
+RESPONSE_CACHE_STATS_BATCH = config(
+    "RESPONSE_CACHE_STATS_BATCH", default=100, cast=int
+)
+
+# Время хранения COUNT(*) постраничной пагинации, секунды.
+# 0 отключает кэширование, счётчик считается на каждый запрос.
+PAGINATION_COUNT_CACHE_TIMEOUT = config(
+    "PAGINATION_COUNT_CACHE_TIMEOUT", default=0, cast=int
+)
+
+# Время жизни первой страницы ленты подписок, секунды. Ленты
+# сбрасываются при появлении и удалении рецептов автора, правки
+# рецептов видны в ленте не позже чем через это время.
+FEED_CACHE_TIMEOUT = config("FEED_CACHE_TIMEOUT", default=60, cast=int)
+
+# Кэш аутентификации по токену в памяти процесса: время жизни записи,
+# секунды (0 — выключен), и число токенов. Версии токенов для сброса
+# во всех воркерах хранятся в общем кэше (CACHES). С LocMemCache выход
+# и смена пароля не видны другим воркерам, поэтому кэш по умолчанию
+# выключен.
+AUTH_TOKEN_CACHE_TIMEOUT = config(
+    "AUTH_TOKEN_CACHE_TIMEOUT", default=0 if CACHE_IS_LOCAL else 30,
+    cast=int,
+)
+AUTH_TOKEN_CACHE_SIZE = config("AUTH_TOKEN_CACHE_SIZE", default=1000, cast=int)
+
+# Гистограммы времени ответа и числа SQL по маршрутам для /metrics.
+# Для нескольких воркеров gunicorn в окружении задаётся
+# PROMETHEUS_MULTIPROC_DIR.
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
+# Кому отдаётся /metrics: адреса и сети клиентов (REMOTE_ADDR) и
+# токен для заголовка "Authorization: Bearer <токен>". Остальным — 403.
+METRICS_ALLOWED_NETWORKS = config(
+    "METRICS_ALLOWED_NETWORKS", default="127.0.0.1/32,::1/128", cast=Csv()
+)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+# Доля запросов, для которых ProfilingMiddleware считает SQL и время
+# в базе (0 — выключено, 1 — каждый запрос), и число одинаковых
+# запросов, начиная с которого они отмечаются как N+1.
+PROFILING_SAMPLE_RATE = config("PROFILING_SAMPLE_RATE", default=0, cast=float)
+PROFILING_DUPLICATE_THRESHOLD = config(
+    "PROFILING_DUPLICATE_THRESHOLD", default=3, cast=int
+)
+
+# Наибольшее число объектов в одном пакетном запросе к избранному,
+# корзине и подпискам.
+BULK_RELATIONS_MAX = config("BULK_RELATIONS_MAX", default=100, cast=int)
+
+# Поиск рецептов по имеющимся ингредиентам: наибольшее число
+# ингредиентов в запросе, наибольшее число рецептов в ответе (и без
+# пагинации, и на странице) и наименьший интервал между перестройками
+# индекса после изменения рецептов, секунды.
+PANTRY_MAX_INGREDIENTS = config(
+    "PANTRY_MAX_INGREDIENTS", default=100, cast=int
+)
+PANTRY_MAX_RESULTS = config("PANTRY_MAX_RESULTS", default=100, cast=int)
+PANTRY_INDEX_REFRESH = config("PANTRY_INDEX_REFRESH", default=60, cast=int)
+
+# Похожие рецепты и рекомендации: число соседей рецепта в таблице,
+# наибольшая длина списка рецептов признака, по которому ищутся
+# кандидаты, и число последних избранных рецептов для рекомендаций.
+RECOMMENDATIONS_NEIGHBORS = config(
+    "RECOMMENDATIONS_NEIGHBORS", default=10, cast=int
+)
+RECOMMENDATIONS_MAX_POSTINGS = config(
+    "RECOMMENDATIONS_MAX_POSTINGS", default=2000, cast=int
+)
+RECOMMENDATIONS_FAVORITES = config(
+    "RECOMMENDATIONS_FAVORITES", default=50, cast=int
+)
+
 AUTH_USER_MODEL = "users.NewUser"
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -105,7 +210,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "core.auth.CachedTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
@@ -139,21 +244,19 @@ LOGGING = {
         },
     },
     'handlers': {
-        'file': {
-            'level': 'DEBUG',
-            'class': 'logging.FileHandler',
-            'filename': 'debug.log',
+        'console': {
+            'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
     },
     'loggers': {
         'django': {
-            'handlers': ['file'],
-            'level': 'DEBUG',
+            'handlers': ['console'],
+            'level': config('DJANGO_LOG_LEVEL', default='INFO'),
             'propagate': True,
         },
         'foodgram': {
-            'handlers': ['file'],
+            'handlers': ['console'],
             'level': 'DEBUG',
             'propagate': True,
         },
@@ -175,20 +278,43 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 PASSWORD_RESET_TIMEOUT = 60 * 60  # 1 hour
 
-LOGGING = {
-    "version": 1,
-    "disable_existing_loggers": False,
-    "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-        },
-    },
-    "loggers": {
-        "django.db.backends": {
-            "level": "DEBUG",  # if DEBUG else 'ERROR',
-            "handlers": [
-                "console",
-            ],
-        },
-    },
+# Поиск ингредиентов по подстроке и похожим названиям через pg_trgm.
+# Расширение и индексы создаёт миграция; без флага в PostgreSQL
+# ищется только начало названия.
+INGREDIENT_SEARCH_TRIGRAM = config(
+    "INGREDIENT_SEARCH_TRIGRAM", default=False, cast=bool
+)
+
+# Каталог ингредиентов в памяти процесса для автодополнения. Для
+# нескольких воркеров кэш (CACHES) должен быть общим, через него
+# передаётся версия каталога.
+INGREDIENT_CATALOG_IN_MEMORY = config(
+    "INGREDIENT_CATALOG_IN_MEMORY", default=False, cast=bool
+)
+
+# Варианты изображения рецепта: максимальный размер и форматы.
+# Форматы, которые не поддерживает установленный Pillow, пропускаются.
+RECIPE_IMAGE_RENDITIONS = {
+    "thumbnail": (250, 250),
+    "full": (500, 500),
 }
+RECIPE_IMAGE_FORMATS = ("jpeg", "webp", "avif")
+
+# Ограничения загружаемых изображений, проверяются до декодирования.
+RECIPE_IMAGE_MAX_BYTES = config(
+    "RECIPE_IMAGE_MAX_BYTES", default=10 * 1024 * 1024, cast=int
+)
+RECIPE_IMAGE_MAX_PIXELS = config(
+    "RECIPE_IMAGE_MAX_PIXELS", default=40_000_000, cast=int
+)
+
+# Потоки для фоновой обработки изображений. IMAGE_PIPELINE_SYNC
+# выполняет обработку сразу после фиксации транзакции.
+IMAGE_PIPELINE_WORKERS = config("IMAGE_PIPELINE_WORKERS", default=2, cast=int)
+IMAGE_PIPELINE_SYNC = config("IMAGE_PIPELINE_SYNC", default=False, cast=bool)
+
+# Шрифт с кириллицей для выгрузки списка покупок в PDF.
+SHOPPING_LIST_PDF_FONT = config(
+    "SHOPPING_LIST_PDF_FONT",
+    default="/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+)
@@ -1,12 +1,17 @@
+from typing import Callable, Iterable
+
 from django.contrib.admin import (ModelAdmin, TabularInline, display, register,
                                   site)
 from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.db.models import QuerySet
 from django.utils.html import format_html
 from django.utils.safestring import SafeString, mark_safe
 
 from recipes.forms import TagForm
 from recipes.models import (AmountIngredient, Carts, Favorites, Ingredient,
-                            Recipe, Tag)
+                            Recipe, RecipeNeighbors, RecipeTag,
+                            ShoppingListItem, Tag)
 
 site.site_header = "Администрирование проекта"
 
@@ -16,9 +21,65 @@ class IngredientInline(TabularInline):
     extra = 2
 
 
+class TagInline(TabularInline):
+    model = RecipeTag
+    extra = 1
+
+
+class ShoppingListAdminMixin:
+    """Поддерживает сводные списки покупок при изменении ингредиентов
+       рецептов в админке: запоминает состав рецептов до изменения и
+       применяет разницу к спискам пользователей, у которых рецепт
+       в корзине."""
+
+    @staticmethod
+    def change_recipes(recipes: Iterable[Recipe], action: Callable) -> None:
+        recipes = {recipe.pk: recipe for recipe in recipes}
+        old_amounts = {
+            pk: ShoppingListItem.objects.recipe_amounts(recipe)
+            for pk, recipe in recipes.items()
+        }
+
+        with transaction.atomic():
+            action()
+            for pk, recipe in recipes.items():
+                ShoppingListItem.objects.change_recipe(
+                    recipe, old_amounts[pk])
+
+
 @register(AmountIngredient)
-class LinksAdmin(ModelAdmin):
-    pass
+class LinksAdmin(ShoppingListAdminMixin, ModelAdmin):
+
+    def save_model(
+        self, request: WSGIRequest, obj: AmountIngredient, form, change: bool
+    ) -> None:
+        recipes = [obj.recipe]
+        if change and "recipe" in form.changed_data:
+            recipes.append(Recipe.objects.get(pk=form.initial["recipe"]))
+
+        self.change_recipes(
+            recipes,
+            lambda: super(LinksAdmin, self).save_model(
+                request, obj, form, change),
+        )
+
+    def delete_model(
+        self, request: WSGIRequest, obj: AmountIngredient
+    ) -> None:
+        self.change_recipes(
+            [obj.recipe],
+            lambda: super(LinksAdmin, self).delete_model(request, obj),
+        )
+
+    def delete_queryset(
+        self, request: WSGIRequest, queryset: QuerySet
+    ) -> None:
+        self.change_recipes(
+            Recipe.objects.filter(
+                pk__in=queryset.values("recipe_id")),
+            lambda: super(LinksAdmin, self).delete_queryset(
+                request, queryset),
+        )
 
 
 @register(Ingredient)
@@ -35,26 +96,25 @@ class IngredientAdmin(ModelAdmin):
 
 
 @register(Recipe)
-class RecipeAdmin(ModelAdmin):
+class RecipeAdmin(ShoppingListAdminMixin, ModelAdmin):
     list_display = (
         "name",
         "author",
         "get_image",
-        "count_favorites",
+        "favorites_count",
+        "carts_count",
     )
     fields = (
         (
             "name",
             "cooking_time",
         ),
-        (
-            "author",
-            "tags",
-        ),
+        ("author",),
         ("text",),
         ("image",),
     )
     raw_id_fields = ("author",)
+    list_select_related = ("author",)
     search_fields = (
         "name",
         "author__username",
@@ -62,20 +122,28 @@ class RecipeAdmin(ModelAdmin):
     )
     list_filter = ("name", "author__username", "tags__name")
 
-    inlines = (IngredientInline,)
+    inlines = (IngredientInline, TagInline)
     save_on_top = True
     empty_value_display = "Значение не указано"
 
+    def save_related(
+        self, request: WSGIRequest, form, formsets, change: bool
+    ) -> None:
+        if not change:
+            super().save_related(request, form, formsets, change)
+            return
+
+        self.change_recipes(
+            [form.instance],
+            lambda: super(RecipeAdmin, self).save_related(
+                request, form, formsets, change),
+        )
+
     def get_image(self, obj: Recipe) -> SafeString:
         return mark_safe(f'<img src={obj.image.url} width="80" hieght="30"')
 
     get_image.short_description = "Изображение"
 
-    def count_favorites(self, obj: Recipe) -> int:
-        return obj.in_favorites.count()
-
-    count_favorites.short_description = "В избранном"
-
 
 @register(Tag)
 class TagAdmin(ModelAdmin):
@@ -129,3 +197,18 @@ class CardAdmin(ModelAdmin):
         self, request: WSGIRequest, obj: Carts | None = None
     ) -> bool:
         return False
+
+
+@register(ShoppingListItem)
+class ShoppingListItemAdmin(ModelAdmin):
+    list_display = ("user", "ingredient", "total_amount")
+    search_fields = ("user__username", "ingredient__name")
+    raw_id_fields = ("user", "ingredient")
+
+
+@register(RecipeNeighbors)
+class RecipeNeighborsAdmin(ModelAdmin):
+    list_display = ("recipe", "stale", "updated")
+    list_filter = ("stale",)
+    search_fields = ("recipe__name",)
+    raw_id_fields = ("recipe",)
@@ -5,3 +5,32 @@ class RecipesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "recipes"
     verbose_name = "Рецепты"
+
+    def ready(self) -> None:
+        from django.db.models.signals import (post_delete, post_save,
+                                              pre_delete)
+
+        from core.cache import RESPONSE_CACHE_MODELS, invalidate_response_cache
+        from core.catalog import invalidate_catalog
+        from core.images import delete_recipe_images
+        from core.pantry import invalidate_pantry_index
+        from core.recommendations import recipe_deleted
+        from core.search import invalidate_recipe_search
+        from core.services import after_recipe_delete, before_recipe_delete
+
+        ingredient = self.get_model("Ingredient")
+        post_save.connect(invalidate_catalog, sender=ingredient)
+        post_delete.connect(invalidate_catalog, sender=ingredient)
+        recipe = self.get_model("Recipe")
+        post_save.connect(invalidate_recipe_search, sender=recipe)
+        post_delete.connect(invalidate_recipe_search, sender=recipe)
+        post_delete.connect(invalidate_pantry_index, sender=recipe)
+        pre_delete.connect(recipe_deleted, sender=recipe)
+        pre_delete.connect(before_recipe_delete, sender=recipe)
+        post_delete.connect(after_recipe_delete, sender=recipe)
+        post_delete.connect(delete_recipe_images, sender=recipe)
+
+        for label in RESPONSE_CACHE_MODELS:
+            model = self.apps.get_model(label)
+            post_save.connect(invalidate_response_cache, sender=model)
+            post_delete.connect(invalidate_response_cache, sender=model)
@@ -0,0 +1,150 @@
+import json
+import platform
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.benchmarks import (MEMORY_GROWTH_LIMIT, SCENARIOS, memory_growth,
+                             run_benchmarks)
+from recipes.models import Carts, Favorites, Recipe
+from users.models import NewUser, Subscriptions
+
+
+class Command(BaseCommand):
+    help = (
+        "Прогоняет сценарии нагрузки через настоящие представления DRF и "
+        "сохраняет пропускную способность, перцентили задержки и число "
+        "запросов к базе в JSON для сравнения запусков."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "scenarios",
+            nargs="*",
+            help=f"Сценарии, по умолчанию все: {', '.join(SCENARIOS)}.",
+        )
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--user", type=int)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument(
+            "--output",
+            default="benchmark-results.json",
+            help="Файл для результатов в формате JSON.",
+        )
+        parser.add_argument(
+            "--compare",
+            help="Файл прошлого запуска для сравнения задержек.",
+        )
+        parser.add_argument(
+            "--check-budgets",
+            action="store_true",
+            help="Завершиться с ошибкой, если p99 сценария превышает "
+            "допустимую задержку.",
+        )
+
+    def handle(self, *args, **options):
+        names = options["scenarios"] or list(SCENARIOS)
+        unknown = set(names) - SCENARIOS.keys()
+        if unknown:
+            raise CommandError(
+                f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+        previous = {}
+        if options["compare"]:
+            previous = json.loads(
+                Path(options["compare"]).read_text())["results"]
+
+        started = datetime.now(timezone.utc)
+        try:
+            results = run_benchmarks(
+                names,
+                options["iterations"],
+                options["warmup"],
+                options["user"],
+                options["seed"],
+                progress=lambda name, result: self.report(
+                    name, result, previous.get(name)),
+            )
+        except ValueError as error:
+            raise CommandError(error)
+
+        for name, growth in memory_growth(results).items():
+            self.stdout.write(
+                f"{name}: пиковая память x{growth} от "
+                f"{results[name]['memory_baseline']}"
+            )
+
+        Path(options["output"]).write_text(
+            json.dumps(
+                {"meta": self.meta(started, options), "results": results},
+                ensure_ascii=False,
+                indent=2,
+            )
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Результаты записаны в {options['output']}")
+        )
+
+        if options["check_budgets"]:
+            over = [
+                name for name, result in results.items()
+                if "budget_ms" in result
+                and result["latency_ms"]["p99"] > result["budget_ms"]
+            ]
+            grown = [
+                name for name, growth in memory_growth(results).items()
+                if growth > MEMORY_GROWTH_LIMIT
+            ]
+            errors = []
+            if over:
+                errors.append(
+                    f"Превышена допустимая задержка: {', '.join(over)}")
+            if grown:
+                errors.append(
+                    "Пиковая память растёт с объёмом данных: "
+                    f"{', '.join(grown)}"
+                )
+            if errors:
+                raise CommandError("; ".join(errors))
+
+    def meta(self, started: datetime, options: dict) -> dict:
+        return {
+            "started_at": started.isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "iterations": options["iterations"],
+            "warmup": options["warmup"],
+            "seed": options["seed"],
+            "dataset": {
+                "users": NewUser.objects.count(),
+                "recipes": Recipe.objects.count(),
+                "favorites": Favorites.objects.count(),
+                "carts": Carts.objects.count(),
+                "subscriptions": Subscriptions.objects.count(),
+            },
+        }
+
+    def report(self, name: str, result: dict, previous: dict | None) -> None:
+        latency = result["latency_ms"]
+        line = (
+            f"{name}: {result['throughput_rps']} rps, "
+            f"p50={latency['p50']}ms p99={latency['p99']}ms, "
+            f"queries={result['queries']['mean']}"
+        )
+        if "peak_memory_kb" in result:
+            line += f", memory={result['peak_memory_kb']}KB"
+        if "budget_ms" in result:
+            line += f", budget={result['budget_ms']}ms"
+
+        if previous:
+            before = previous["latency_ms"]
+            line += (
+                f" (p50 {latency['p50'] - before['p50']:+.3f}ms, "
+                f"p99 {latency['p99'] - before['p99']:+.3f}ms)"
+            )
+        self.stdout.write(line)
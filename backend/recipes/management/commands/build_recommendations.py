@@ -0,0 +1,43 @@
+import resource
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from core.recommendations import (build_neighbors, load_similarity_index,
+                                  refresh_neighbors)
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает таблицу похожих рецептов для рекомендаций: по "
+        "умолчанию только изменившиеся рецепты, с --full — все. "
+        "Рассчитана на периодический запуск."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Пересчитать все рецепты.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = perf_counter()
+        index = load_similarity_index()
+        loaded = perf_counter()
+
+        build = build_neighbors if options["full"] else refresh_neighbors
+        count = build(index, options["batch_size"])
+        finished = perf_counter()
+
+        # ru_maxrss в Linux — в килобайтах.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Рецептов в индексе: {len(index)}, пересчитано: {count}. "
+                f"Индекс: {loaded - started:.1f} с, соседи: "
+                f"{finished - loaded:.1f} с, пик памяти процесса: "
+                f"{peak:.0f} МБ."
+            )
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.cache import response_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Показывает попадания и промахи кэша ответов тегов и ингредиентов."
+
+    def handle(self, *args, **options):
+        for namespace, counters in response_cache_stats().items():
+            total = counters["hits"] + counters["misses"]
+            ratio = counters["hits"] / total if total else 0
+            self.stdout.write(
+                f'{namespace}: hits={counters["hits"]} '
+                f'misses={counters["misses"]} ratio={ratio:.2%}'
+            )
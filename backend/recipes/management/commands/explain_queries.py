@@ -0,0 +1,143 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Exists, OuterRef, QuerySet
+
+from core.search import PostgresRecipeSearch
+from recipes.models import (Carts, Favorites, Recipe, RecipeTag,
+                            ShoppingListItem, Tag)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Выполняет EXPLAIN ANALYZE основных запросов API и завершается "
+        "с ошибкой, если какой-то из них читает большую таблицу "
+        "последовательным сканированием."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threshold",
+            type=int,
+            default=10_000,
+            help="Размер таблицы, начиная с которого Seq Scan — ошибка.",
+        )
+        parser.add_argument(
+            "--user",
+            type=int,
+            help="Пользователь, от имени которого строятся запросы.",
+        )
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="Обновить статистику таблиц перед проверкой.",
+        )
+
+    def canonical_queries(self, user: User) -> dict[str, QuerySet]:
+        author = Recipe.objects.filter(
+            author__isnull=False).values("author")[:1]
+        tag = Tag.objects.values("slug")[:1]
+        favorited = Exists(
+            Favorites.objects.filter(user=user, recipe=OuterRef("pk")))
+        in_cart = Exists(
+            Carts.objects.filter(user=user, recipe=OuterRef("pk")))
+
+        return {
+            "recipes_page": Recipe.objects.with_user_flags(user)
+            .select_related("author")[:6],
+            "recipes_by_tag": Recipe.objects.filter(
+                Exists(RecipeTag.objects.filter(
+                    recipe=OuterRef("pk"), tag__slug__in=tag))
+            )[:6],
+            "recipes_favorited": Recipe.objects.filter(favorited)[:6],
+            "recipes_not_favorited": Recipe.objects.filter(~favorited)[:6],
+            "recipes_in_cart": Recipe.objects.filter(in_cart)[:6],
+            "recipes_not_in_cart": Recipe.objects.filter(~in_cart)[:6],
+            "recipes_search": PostgresRecipeSearch().search(
+                Recipe.objects.all(), "суп")[:6],
+            "recipes_popular": Recipe.objects.order_by(
+                "-favorites_count", "-pub_date", "-id")[:6],
+            "author_recipes": Recipe.objects.filter(
+                author__in=author).order_by("-pub_date")[:3],
+            "feed": Recipe.objects.filter(
+                author__subscribers__user=user
+            ).order_by("-pub_date", "-id")[:6],
+            "subscriptions": User.objects.filter(
+                subscribers__user=user
+            ).order_by("-subscribers__date_added")[:6],
+            "favorites_by_date": Favorites.objects.filter(
+                user=user).order_by("-date_added")[:6],
+            "shopping_list": ShoppingListItem.objects.filter(user=user),
+        }
+
+    def seq_scans(self, plan: dict) -> list[str]:
+        tables = []
+        if plan.get("Node Type") == "Seq Scan":
+            tables.append(plan["Relation Name"])
+
+        for child in plan.get("Plans", ()):
+            tables.extend(self.seq_scans(child))
+        return tables
+
+    def table_size(self, table: str) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                (table,),
+            )
+            row = cursor.fetchone()
+        return max(row[0], 0) if row else 0
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Команда работает только с PostgreSQL.")
+
+        if options["analyze"]:
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+        users = User.objects.all()
+        if options["user"]:
+            users = users.filter(pk=options["user"])
+        else:
+            users = users.filter(favorites__isnull=False).distinct()
+
+        user = users.first()
+        if user is None:
+            raise CommandError("Нет пользователя для построения запросов.")
+
+        failures = []
+
+        for name, queryset in self.canonical_queries(user).items():
+            plan = json.loads(queryset.explain(format="json", analyze=True))
+            root = plan[0]
+            large = [
+                (table, self.table_size(table))
+                for table in self.seq_scans(root["Plan"])
+            ]
+            large = [
+                (table, size) for table, size in large
+                if size > options["threshold"]
+            ]
+            self.stdout.write(
+                f'{name}: {root["Execution Time"]:.2f} ms'
+                + "".join(
+                    f", Seq Scan {table} ({size} строк)"
+                    for table, size in large
+                )
+            )
+            if large:
+                failures.append(name)
+
+        if failures:
+            raise CommandError(
+                "Последовательное сканирование в запросах: "
+                + ", ".join(failures)
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS("Все запросы используют индексы."))
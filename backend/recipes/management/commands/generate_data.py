@@ -0,0 +1,295 @@
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+from random import Random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from core.pantry import invalidate_pantry_index
+from core.search import invalidate_recipe_search
+from recipes.models import (AmountIngredient, Carts, Favorites, Ingredient,
+                            Recipe, RecipeTag, Tag)
+from users.models import Subscriptions
+
+User = get_user_model()
+
+USERNAME_PREFIX = "bench_"
+IMAGE_NAME = "recipe_images/bench.jpg"
+BATCH_SIZE = 1000
+
+
+def zipf_weights(size: int, exponent: float = 1.0) -> list[float]:
+    """Накопленные веса популярности для Random.choices: первые объекты
+       выбираются заметно чаще."""
+    return list(
+        accumulate(1 / (rank + 1) ** exponent for rank in range(size)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Создаёт воспроизводимый набор синтетических данных для нагрузочных "
+        "тестов: пользователей, рецепты, избранное, корзины и подписки. "
+        "Одинаковые параметры и --seed дают одинаковые данные."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=10_000)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument(
+            "--ingredients-per-recipe", type=int, nargs=2, default=(3, 15),
+            metavar=("MIN", "MAX"),
+        )
+        parser.add_argument(
+            "--tags-per-recipe", type=int, nargs=2, default=(1, 3),
+            metavar=("MIN", "MAX"),
+        )
+        parser.add_argument("--favorites-per-user", type=int, default=20)
+        parser.add_argument("--carts-per-user", type=int, default=5)
+        parser.add_argument("--subscriptions-per-user", type=int, default=10)
+        parser.add_argument(
+            "--power-users",
+            type=int,
+            default=1,
+            help="Пользователи с большим числом подписок для теста ленты.",
+        )
+        parser.add_argument(
+            "--power-subscriptions",
+            type=int,
+            default=1000,
+            help="Число подписок у каждого из --power-users.",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Удалить ранее созданные синтетические данные и выйти.",
+        )
+
+    def handle(self, *args, **options):
+        users, recipes = [], []
+
+        with transaction.atomic():
+            self.clear()
+
+            if not options["clear"]:
+                rng = Random(options["seed"])
+                tag_ids, ingredient_ids = self.catalog()
+                users = self.create_users(options["users"])
+                recipes = self.create_recipes(rng, users, options["recipes"])
+                self.create_recipe_links(
+                    rng, recipes, tag_ids, ingredient_ids, options)
+                self.create_relations(rng, users, recipes, options)
+
+        # bulk_create не отправляет сигналы, индексы сбрасываются
+        # вручную.
+        invalidate_recipe_search()
+        invalidate_pantry_index()
+
+        call_command("rebuild_shopping_lists", stdout=self.stdout)
+        call_command("reconcile_counters", stdout=self.stdout)
+        call_command("build_recommendations", full=True, stdout=self.stdout)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Создано пользователей: {len(users)}, "
+                f"рецептов: {len(recipes)}."
+            )
+        )
+
+    def clear(self) -> None:
+        """Удаляет синтетических пользователей и их рецепты вместе со
+           связями."""
+        Recipe.objects.filter(
+            author__username__startswith=USERNAME_PREFIX).delete()
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def catalog(self) -> tuple[list[int], list[int]]:
+        """Теги и ингредиенты из базы. Если их нет, создаются
+           синтетические."""
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=f"тег {i}", color=f"#{i:06x}", slug=f"tag-{i}")
+                for i in range(8)
+            )
+        if not Ingredient.objects.exists():
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(
+                        name=f"ингредиент {i}",
+                        measurement_unit=("г", "мл", "шт")[i % 3],
+                    )
+                    for i in range(2000)
+                ),
+                batch_size=BATCH_SIZE,
+            )
+
+        return (
+            list(Tag.objects.order_by("pk").values_list("pk", flat=True)),
+            list(
+                Ingredient.objects.order_by("pk").values_list("pk", flat=True)
+            ),
+        )
+
+    def create_users(self, count: int) -> list[int]:
+        password = make_password("benchmark")
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f"{USERNAME_PREFIX}{i:06d}",
+                    email=f"{USERNAME_PREFIX}{i:06d}@example.com",
+                    first_name="Тест",
+                    last_name="Нагрузка",
+                    password=password,
+                )
+                for i in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        return list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX)
+            .order_by("username")
+            .values_list("pk", flat=True)
+        )
+
+    def placeholder_image(self) -> str:
+        if not default_storage.exists(IMAGE_NAME):
+            buffer = BytesIO()
+            Image.new("RGB", (500, 500), "orange").save(buffer, "JPEG")
+            return default_storage.save(
+                IMAGE_NAME, ContentFile(buffer.getvalue()))
+        return IMAGE_NAME
+
+    def create_recipes(
+        self, rng: Random, users: list[int], count: int
+    ) -> list[int]:
+        """Рецепты распределены по авторам неравномерно, даты публикации
+           разнесены на год назад."""
+        image = self.placeholder_image()
+        authors = rng.choices(
+            users, cum_weights=zipf_weights(len(users), 0.8), k=count)
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    name=f"Рецепт {i}",
+                    author_id=author_id,
+                    image=image,
+                    text="Синтетический рецепт для нагрузочного теста.",
+                    cooking_time=rng.randint(1, 300),
+                )
+                for i, author_id in enumerate(authors)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        recipes = list(
+            Recipe.objects.filter(author_id__in=users)
+            .only("pk", "pub_date").order_by("pk")
+        )
+
+        now = timezone.now()
+        for recipe in recipes:
+            recipe.pub_date = now - timedelta(
+                seconds=rng.randint(0, 365 * 24 * 60 * 60))
+        Recipe.objects.bulk_update(
+            recipes, ("pub_date",), batch_size=BATCH_SIZE)
+        return [recipe.pk for recipe in recipes]
+
+    def create_recipe_links(
+        self,
+        rng: Random,
+        recipes: list[int],
+        tag_ids: list[int],
+        ingredient_ids: list[int],
+        options: dict,
+    ) -> None:
+        ingredient_weights = zipf_weights(len(ingredient_ids), 0.7)
+        tags, amounts = [], []
+
+        for recipe_id in recipes:
+            low, high = options["tags_per_recipe"]
+            for tag_id in rng.sample(
+                tag_ids, min(rng.randint(low, high), len(tag_ids))
+            ):
+                tags.append(RecipeTag(recipe_id=recipe_id, tag_id=tag_id))
+
+            low, high = options["ingredients_per_recipe"]
+            chosen = set(
+                rng.choices(
+                    ingredient_ids,
+                    cum_weights=ingredient_weights,
+                    k=rng.randint(low, high),
+                )
+            )
+            for ingredient_id in sorted(chosen):
+                amounts.append(
+                    AmountIngredient(
+                        recipe_id=recipe_id,
+                        ingredients_id=ingredient_id,
+                        amount=rng.randint(1, 32),
+                    )
+                )
+
+        RecipeTag.objects.bulk_create(tags, batch_size=BATCH_SIZE)
+        AmountIngredient.objects.bulk_create(amounts, batch_size=BATCH_SIZE)
+
+    @staticmethod
+    def sample(
+        rng: Random, population: list[int], weights: list[float], k: int
+    ) -> set[int]:
+        """До k разных объектов с учётом весов популярности."""
+        chosen = set()
+
+        for pk in rng.choices(population, cum_weights=weights, k=k * 3):
+            if len(chosen) >= k:
+                break
+            chosen.add(pk)
+        return chosen
+
+    def create_relations(
+        self, rng: Random, users: list[int], recipes: list[int],
+        options: dict,
+    ) -> None:
+        recipe_weights = zipf_weights(len(recipes))
+        author_weights = zipf_weights(len(users), 0.8)
+        favorites, carts, subscriptions = [], [], []
+        power_users = set(users[:options["power_users"]])
+
+        for user_id in users:
+            for recipe_id in sorted(self.sample(
+                rng, recipes, recipe_weights, options["favorites_per_user"]
+            )):
+                favorites.append(
+                    Favorites(user_id=user_id, recipe_id=recipe_id))
+
+            for recipe_id in sorted(self.sample(
+                rng, recipes, recipe_weights, options["carts_per_user"]
+            )):
+                carts.append(Carts(user_id=user_id, recipe_id=recipe_id))
+
+            if user_id in power_users:
+                authors = set(
+                    rng.sample(
+                        users,
+                        min(options["power_subscriptions"] + 1, len(users)),
+                    )
+                )
+            else:
+                authors = self.sample(
+                    rng, users, author_weights,
+                    options["subscriptions_per_user"],
+                )
+
+            for author_id in sorted(authors - {user_id}):
+                subscriptions.append(
+                    Subscriptions(user_id=user_id, author_id=author_id))
+
+        Favorites.objects.bulk_create(favorites, batch_size=BATCH_SIZE)
+        Carts.objects.bulk_create(carts, batch_size=BATCH_SIZE)
+        Subscriptions.objects.bulk_create(
+            subscriptions, batch_size=BATCH_SIZE)
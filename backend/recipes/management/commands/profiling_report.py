@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from core.profiling import reset_view_stats, view_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает накопленную ProfilingMiddleware статистику по "
+        "представлениям: средние число запросов, время в базе и общее "
+        "время, долю запросов с повторяющимися SQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Сбросить статистику после вывода.",
+        )
+
+    def handle(self, *args, **options):
+        stats = sorted(
+            view_stats().items(),
+            key=lambda item: item[1]["db_us"],
+            reverse=True,
+        )
+
+        for view, counters in stats:
+            requests = counters["requests"] or 1
+            self.stdout.write(
+                f"{view}: requests={counters['requests']} "
+                f"queries={counters['queries'] / requests:.1f} "
+                f"db={counters['db_us'] / requests / 1000:.2f}ms "
+                f"total={counters['total_us'] / requests / 1000:.2f}ms "
+                f"n+1={counters['n_plus_1'] / requests:.0%}"
+            )
+
+        if options["reset"]:
+            reset_view_stats()
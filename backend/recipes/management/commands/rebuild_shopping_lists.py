@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает сводные списки покупок по корзинам пользователей "
+        "или проверяет их соответствие (--verify)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Только сравнить списки с корзинами, ничего не меняя.",
+        )
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="user_ids",
+            help="Обработать только указанных пользователей.",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options["user_ids"]
+        live = {
+            (row["user_id"], row["ingredients_id"]): row["total_amount"]
+            for row in ShoppingListItem.objects.live_totals(user_ids)
+        }
+
+        if options["verify"]:
+            self.verify(live, user_ids)
+            return
+
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+
+        with transaction.atomic():
+            items.delete()
+            ShoppingListItem.objects.bulk_create(
+                (
+                    ShoppingListItem(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=total_amount,
+                    )
+                    for (user_id, ingredient_id), total_amount in live.items()
+                ),
+                batch_size=1000,
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Записано позиций: {len(live)}")
+        )
+
+    def verify(self, live: dict, user_ids: list[int] | None) -> None:
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+
+        stored = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount in items.values_list(
+                "user_id", "ingredient_id", "total_amount")
+        }
+        mismatches = [
+            (key, stored.get(key), live.get(key))
+            for key in stored.keys() | live.keys()
+            if stored.get(key) != live.get(key)
+        ]
+
+        for (user_id, ingredient_id), saved, actual in sorted(
+            mismatches, key=lambda row: row[0]
+        ):
+            self.stdout.write(
+                f"user={user_id} ingredient={ingredient_id}: "
+                f"в списке {saved}, в корзине {actual}"
+            )
+
+        if mismatches:
+            raise CommandError(f"Расхождений: {len(mismatches)}")
+
+        self.stdout.write(self.style.SUCCESS("Списки покупок совпадают."))
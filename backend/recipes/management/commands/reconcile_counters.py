@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from core.counters import actual_count
+from recipes.models import Carts, Favorites, Recipe
+from users.models import Subscriptions
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет счётчики избранного, корзин, рецептов и подписчиков "
+        "с фактическим числом связей и исправляет расхождения. "
+        "Рассчитана на периодический запуск."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать число расхождений, ничего не меняя.",
+        )
+
+    def counters(self) -> list[tuple]:
+        return [
+            (Recipe, "favorites_count", actual_count(Favorites, "recipe")),
+            (Recipe, "carts_count", actual_count(Carts, "recipe")),
+            (User, "recipes_count", actual_count(Recipe, "author")),
+            (
+                User,
+                "subscribers_count",
+                actual_count(Subscriptions, "author"),
+            ),
+        ]
+
+    def handle(self, *args, **options):
+        total = 0
+
+        for model, counter, actual in self.counters():
+            with transaction.atomic():
+                drifted = model.objects.alias(actual=actual).filter(
+                    ~Q(**{counter: actual}))
+
+                if options["dry_run"]:
+                    fixed = drifted.count()
+                else:
+                    fixed = drifted.update(**{counter: actual})
+
+            total += fixed
+            self.stdout.write(
+                f"{model._meta.label}.{counter}: расхождений {fixed}")
+
+        if options["dry_run"]:
+            self.stdout.write(f"Всего расхождений: {total}")
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"Исправлено значений: {total}"))
@@ -0,0 +1,95 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients',
+            field=models.ManyToManyField(related_name='recipes', through='recipes.AmountIngredient', to='recipes.ingredient'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags',
+            field=models.ManyToManyField(related_name='recipes', to='recipes.tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_for_ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.CheckConstraint(check=models.Q(('name__length__gt', 0)), name='recipes_ingredient_name_is_empty'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.CheckConstraint(check=models.Q(('measurement_unit__length__gt', 0)), name='recipes_ingredient_measurement_unit_is_empty'),
+        ),
+        migrations.AddField(
+            model_name='favorites',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='in_favorites', to='recipes.recipe', verbose_name='Понравившийся рецепт'),
+        ),
+        migrations.AddField(
+            model_name='favorites',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddField(
+            model_name='carts',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='in_carts', to='recipes.recipe', verbose_name='Рецепты в списке покупок'),
+        ),
+        migrations.AddField(
+            model_name='carts',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='carts', to=settings.AUTH_USER_MODEL, verbose_name='Владелец списка'),
+        ),
+        migrations.AddField(
+            model_name='amountingredient',
+            name='ingredients',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe', to='recipes.ingredient', verbose_name='Связанные ингредиенты'),
+        ),
+        migrations.AddField(
+            model_name='amountingredient',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient', to='recipes.recipe', verbose_name='В каких рецептах'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipe',
+            constraint=models.UniqueConstraint(fields=('name', 'author'), name='unique_for_author'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipe',
+            constraint=models.CheckConstraint(check=models.Q(('name__length__gt', 0)), name='recipes_recipe_name_is_empty'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorites',
+            constraint=models.UniqueConstraint(fields=('recipe', 'user'), name='recipes_favorites_recipe_is_favorite_already'),
+        ),
+        migrations.AddConstraint(
+            model_name='carts',
+            constraint=models.UniqueConstraint(fields=('recipe', 'user'), name='recipes_carts_recipe_is_cart_already'),
+        ),
+        migrations.AddConstraint(
+            model_name='amountingredient',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredients'), name='recipes_amountingredient_ingredient_already_added'),
+        ),
+    ]
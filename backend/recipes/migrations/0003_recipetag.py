@@ -0,0 +1,69 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Recipe.tags переходит на явную промежуточную модель RecipeTag.
+       Таблица recipes_recipe_tags, её столбцы и ограничение
+       уникальности уже созданы для ManyToManyField, поэтому в базе
+       ничего не меняется, кроме нового индекса по тэгу."""
+
+    dependencies = [
+        ("recipes", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="RecipeTag",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "recipe",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="recipes.recipe",
+                            ),
+                        ),
+                        (
+                            "tag",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="recipes.tag",
+                            ),
+                        ),
+                    ],
+                    options={
+                        "verbose_name": "Тэг рецепта",
+                        "verbose_name_plural": "Тэги рецептов",
+                        "db_table": "recipes_recipe_tags",
+                        "unique_together": {("recipe", "tag")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="recipe",
+                    name="tags",
+                    field=models.ManyToManyField(
+                        related_name="recipes",
+                        through="recipes.RecipeTag",
+                        to="recipes.tag",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="recipetag",
+            index=models.Index(
+                fields=["tag", "recipe"], name="recipes_recipetag_tag_recipe"
+            ),
+        ),
+    ]
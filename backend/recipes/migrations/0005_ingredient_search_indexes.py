@@ -0,0 +1,37 @@
+from django.db import migrations
+
+from core.operations import PostgresRunSQL
+
+
+class Migration(migrations.Migration):
+    """Индексы поиска ингредиентов в PostgreSQL: префиксный для
+       `istartswith` и триграммный для подстроки и похожих названий.
+       Раньше создавались обработчиком post_migrate, поэтому
+       IF NOT EXISTS. При откате расширение pg_trgm остаётся: его могут
+       использовать и другие объекты базы."""
+
+    dependencies = [
+        ("recipes", "0004_counters_indexes_shopping_list"),
+    ]
+
+    operations = [
+        PostgresRunSQL(
+            sql="CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        PostgresRunSQL(
+            sql=(
+                "CREATE INDEX IF NOT EXISTS recipes_ingredient_name_prefix "
+                "ON recipes_ingredient (UPPER(name::text) text_pattern_ops)"
+            ),
+            reverse_sql="DROP INDEX IF EXISTS recipes_ingredient_name_prefix",
+        ),
+        PostgresRunSQL(
+            sql=(
+                "CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm "
+                "ON recipes_ingredient "
+                "USING gin (UPPER(name::text) gin_trgm_ops)"
+            ),
+            reverse_sql="DROP INDEX IF EXISTS recipes_ingredient_name_trgm",
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+from core.operations import PostgresRunSQL
+
+
+class Migration(migrations.Migration):
+    """Полнотекстовый поиск рецептов в PostgreSQL: вычисляемый столбец
+       search_vector по названию (вес A) и описанию (вес B) в русской и
+       английской конфигурациях и GIN-индекс по нему. Столбец обновляет
+       сама база, в моделях его нет. Раньше создавался обработчиком
+       post_migrate, поэтому IF NOT EXISTS."""
+
+    dependencies = [
+        ("recipes", "0005_ingredient_search_indexes"),
+    ]
+
+    operations = [
+        PostgresRunSQL(
+            sql=(
+                "ALTER TABLE recipes_recipe "
+                "ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                "GENERATED ALWAYS AS ("
+                "setweight(to_tsvector('russian', coalesce(name, '')), 'A')"
+                " || setweight(to_tsvector('english', coalesce(name, '')), "
+                "'A')"
+                " || setweight(to_tsvector('russian', coalesce(text, '')), "
+                "'B')"
+                " || setweight(to_tsvector('english', coalesce(text, '')), "
+                "'B')"
+                ") STORED"
+            ),
+            reverse_sql=(
+                "ALTER TABLE recipes_recipe "
+                "DROP COLUMN IF EXISTS search_vector"
+            ),
+        ),
+        PostgresRunSQL(
+            sql=(
+                "CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector "
+                "ON recipes_recipe USING gin (search_vector)"
+            ),
+            reverse_sql="DROP INDEX IF EXISTS recipes_recipe_search_vector",
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+from django.db.models import F, Sum
+
+
+def fill_shopping_lists(apps, schema_editor):
+    """Заполняет сводные списки покупок по уже существующим корзинам,
+       так же как manage.py rebuild_shopping_lists."""
+    AmountIngredient = apps.get_model("recipes", "AmountIngredient")
+    ShoppingListItem = apps.get_model("recipes", "ShoppingListItem")
+
+    totals = (
+        AmountIngredient.objects.filter(recipe__in_carts__isnull=False)
+        .values("ingredients_id", user_id=F("recipe__in_carts__user_id"))
+        .annotate(total_amount=Sum("amount"))
+        .order_by()
+    )
+    ShoppingListItem.objects.all().delete()
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=row["user_id"],
+                ingredient_id=row["ingredients_id"],
+                total_amount=row["total_amount"],
+            )
+            for row in totals.iterator(chunk_size=10_000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    """Списки покупок, созданные миграцией 0004, пусты: без заполнения
+       у пользователей с непустой корзиной не скачивался список."""
+
+    dependencies = [
+        ("recipes", "0006_recipe_search_vector"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            fill_shopping_lists, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# (модель, счётчик, модель связи, поле связи с объектом).
+COUNTERS = (
+    ("recipes.Recipe", "favorites_count", "recipes.Favorites", "recipe"),
+    ("recipes.Recipe", "carts_count", "recipes.Carts", "recipe"),
+    ("users.NewUser", "recipes_count", "recipes.Recipe", "author"),
+    ("users.NewUser", "subscribers_count", "users.Subscriptions", "author"),
+)
+
+
+def fill_counters(apps, schema_editor):
+    """Записывает фактическое число связей в счётчики, добавленные
+       миграциями recipes 0004 и users 0002 со значением 0."""
+    for label, counter, link_label, field in COUNTERS:
+        model = apps.get_model(label)
+        link_model = apps.get_model(link_label)
+        actual = Coalesce(
+            Subquery(
+                link_model.objects.filter(**{field: OuterRef("pk")})
+                .order_by()
+                .values(field)
+                .annotate(count=Count("pk"))
+                .values("count"),
+                output_field=IntegerField(),
+            ),
+            0,
+        )
+        model.objects.update(**{counter: actual})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0007_fill_shopping_lists"),
+        ("users", "0002_counters_subscriptions_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            fill_counters, reverse_code=migrations.RunPython.noop),
+    ]
@@ -1,10 +1,13 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
-from django.db.models import Q
-from PIL import Image
+from django.db import models, transaction
+from django.db.models import F, Q, QuerySet, Sum
 
+from core.cache import invalidate_author_feeds
+from core.counters import change_counter
+from core.images import delete_renditions, schedule_recipe_image
 from core.validators import AlphabetValidator, HexColorValidator
+from users.models import Subscriptions
 
 User = get_user_model()
 
@@ -74,6 +77,69 @@ class Ingredient(models.Model):
         super().clean()
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов для вывода в API."""
+
+    def with_related(self) -> "RecipeQuerySet":
+        """Заранее загружает автора, теги и ингредиенты."""
+        return self.select_related("author").prefetch_related(
+            "tags",
+            models.Prefetch(
+                "ingredient",
+                queryset=AmountIngredient.objects.select_related(
+                    "ingredients"),
+            ),
+        )
+
+    def with_user_flags(self, user) -> "RecipeQuerySet":
+        """Добавляет флаги избранного, корзины и подписки на автора
+           для пользователя."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False),
+                author_is_subscribed=models.Value(False),
+            )
+
+        return self.annotate(
+            is_favorited=models.Exists(
+                Favorites.objects.filter(
+                    user=user, recipe=models.OuterRef("pk"))
+            ),
+            is_in_shopping_cart=models.Exists(
+                Carts.objects.filter(user=user, recipe=models.OuterRef("pk"))
+            ),
+            author_is_subscribed=models.Exists(
+                Subscriptions.objects.filter(
+                    user=user, author=models.OuterRef("author"))
+            ),
+        )
+
+
+class RecipeTag(models.Model):
+    """Связь рецепта с тэгом. Использует таблицу, которую Django
+       создавал для ManyToManyField, и добавляет индекс по тэгу."""
+    recipe = models.ForeignKey("Recipe", on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = "recipes_recipe_tags"
+        verbose_name = "Тэг рецепта"
+        verbose_name_plural = "Тэги рецептов"
+        # Как у таблицы, созданной для ManyToManyField: ограничение с тем
+        # же именем уже есть в базе.
+        unique_together = (("recipe", "tag"),)
+        indexes = (
+            models.Index(
+                fields=("tag", "recipe"),
+                name="%(app_label)s_recipetag_tag_recipe",
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f"{self.recipe_id} -> {self.tag_id}"
+
+
 class Recipe(models.Model):
     """Модель рецепта, содержащая информацию о блюде и его составляющих."""
     name = models.CharField("Название блюда", max_length=64)
@@ -84,7 +150,9 @@ class Recipe(models.Model):
         on_delete=models.SET_NULL,
         null=True,
     )
-    tags = models.ManyToManyField(Tag, related_name="recipes")
+    tags = models.ManyToManyField(
+        Tag, related_name="recipes", through=RecipeTag
+    )
     ingredients = models.ManyToManyField(
         Ingredient, related_name="recipes", through="AmountIngredient"
     )
@@ -93,6 +161,15 @@ class Recipe(models.Model):
                                     editable=False)
     image = models.ImageField("Изображение блюда",
                               upload_to="recipe_images/")
+    image_renditions = models.JSONField(
+        "Варианты изображения", default=dict, blank=True, editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        "В избранном", default=0, editable=False
+    )
+    carts_count = models.PositiveIntegerField(
+        "В списках покупок", default=0, editable=False
+    )
     text = models.TextField("Описание блюда", max_length=5000)
     cooking_time = models.PositiveSmallIntegerField(
         "Время приготовления",
@@ -107,6 +184,20 @@ class Recipe(models.Model):
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         ordering = ("-pub_date",)
+        indexes = (
+            models.Index(
+                fields=("-pub_date", "-id"),
+                name="%(app_label)s_%(class)s_pub_date_id",
+            ),
+            models.Index(
+                fields=("author", "-pub_date"),
+                name="%(app_label)s_%(class)s_author_pub_date",
+            ),
+            models.Index(
+                fields=("-favorites_count", "-pub_date", "-id"),
+                name="%(app_label)s_%(class)s_popular",
+            ),
+        )
         constraints = (
             models.UniqueConstraint(fields=("name", "author"),
                                     name="unique_for_author"),
@@ -116,6 +207,8 @@ class Recipe(models.Model):
             ),
         )
 
+    objects = RecipeQuerySet.as_manager()
+
     def __str__(self) -> str:
         return f"{self.name}. Автор: {self.author.username}"
 
@@ -126,20 +219,40 @@ class Recipe(models.Model):
         self.name = self.name.capitalize()
         super().clean()
 
+    @classmethod
+    def from_db(cls, db, field_names, values) -> "Recipe":
+        recipe = super().from_db(db, field_names, values)
+        recipe._loaded_image = recipe.__dict__.get("image")
+        return recipe
+
     def save(self, *args, **kwargs) -> None:
         """Сохраняет изменения объекта модели рецепта в базе данных.
-           Перед сохранением ресайзит изображение рецепта до размеров
-           500x500 пикселей."""
+           Новый рецепт увеличивает счётчик рецептов автора и сбрасывает
+           ленты его подписчиков. Правки рецепта ленты не сбрасывают и
+           видны в них через FEED_CACHE_TIMEOUT. Если изображение изменилось,
+           ставит в очередь построение его уменьшенных вариантов."""
+        loaded_image = getattr(self, "_loaded_image", None)
+        adding = self._state.adding
         super().save(*args, **kwargs)
-        image = Image.open(self.image.path)
-        image.thumbnail((500, 500))
-        image.save(self.image.path)
 
-    def delete(self, *args, **kwargs):
-        """Удаляет картинку при удаление рецепта."""
-        if self.image:
-            self.image.delete(save=False)
-        super().delete(*args, **kwargs)
+        if adding and self.author_id is not None:
+            change_counter(User, "recipes_count", [self.author_id], 1)
+
+            author_id = self.author_id
+            transaction.on_commit(lambda: invalidate_author_feeds(author_id))
+
+        if self.image and self.image.name != loaded_image:
+            old_renditions = self.image_renditions
+
+            if old_renditions:
+                Recipe.objects.filter(pk=self.pk).update(image_renditions={})
+                self.image_renditions = {}
+                transaction.on_commit(
+                    lambda: delete_renditions(old_renditions))
+
+            schedule_recipe_image(self.pk, self.image.name)
+
+        self._loaded_image = self.image.name
 
 
 class AmountIngredient(models.Model):
@@ -205,6 +318,13 @@ class Favorites(models.Model):
                 fields=("recipe", "user"),
                 name="%(app_label)s_%(class)s_recipe_is_favorite_already"),
         )
+        indexes = (
+            models.Index(
+                fields=("user", "-date_added"),
+                include=("recipe",),
+                name="%(app_label)s_%(class)s_user_date",
+            ),
+        )
 
     def __str__(self) -> str:
         return f"{self.user} -> {self.recipe}"
@@ -236,6 +356,210 @@ class Carts(models.Model):
                 fields=("recipe", "user"),
                 name="%(app_label)s_%(class)s_recipe_is_cart_already"),
         )
+        indexes = (
+            models.Index(
+                fields=("user", "-date_added"),
+                include=("recipe",),
+                name="%(app_label)s_%(class)s_user_date",
+            ),
+        )
 
     def __str__(self) -> str:
         return f"{self.user} -> {self.recipe}"
+
+
+class ShoppingListItemManager(models.Manager):
+    """Менеджер для инкрементального пересчёта списков покупок."""
+
+    @staticmethod
+    def recipe_amounts(recipe: Recipe) -> dict[int, int]:
+        """Количество каждого ингредиента в рецепте."""
+        return dict(
+            AmountIngredient.objects.filter(recipe=recipe).values_list(
+                "ingredients_id", "amount")
+        )
+
+    @staticmethod
+    def recipes_amounts(recipe_ids: list[int]) -> dict[int, int]:
+        """Суммарное количество каждого ингредиента в нескольких
+           рецептах."""
+        return dict(
+            AmountIngredient.objects.filter(recipe_id__in=recipe_ids)
+            .values("ingredients_id")
+            .annotate(total=Sum("amount"))
+            .values_list("ingredients_id", "total")
+        )
+
+    @staticmethod
+    def cart_user_ids(recipe: Recipe) -> list[int]:
+        """Пользователи, у которых рецепт лежит в списке покупок."""
+        return list(
+            Carts.objects.filter(recipe=recipe).values_list(
+                "user_id", flat=True)
+        )
+
+    def apply_delta(
+        self, user_ids: list[int], delta: dict[int, int]
+    ) -> None:
+        """Добавляет к спискам покупок пользователей изменения количества
+           ингредиентов. Нулевые и отрицательные позиции удаляются."""
+        delta = {pk: amount for pk, amount in delta.items() if amount}
+
+        if not user_ids or not delta:
+            return
+
+        with transaction.atomic():
+            existing = {
+                (item.user_id, item.ingredient_id): item
+                for item in self.select_for_update().filter(
+                    user_id__in=user_ids, ingredient_id__in=delta.keys()
+                )
+            }
+            to_create, to_update, to_delete = [], [], []
+
+            for user_id in user_ids:
+                for ingredient_id, amount in delta.items():
+                    item = existing.get((user_id, ingredient_id))
+
+                    if item is None:
+                        if amount > 0:
+                            to_create.append(
+                                self.model(
+                                    user_id=user_id,
+                                    ingredient_id=ingredient_id,
+                                    total_amount=amount,
+                                )
+                            )
+                    elif item.total_amount + amount > 0:
+                        item.total_amount += amount
+                        to_update.append(item)
+                    else:
+                        to_delete.append(item.pk)
+
+            self.bulk_update(to_update, ("total_amount",))
+            self.bulk_create(to_create)
+            if to_delete:
+                self.filter(pk__in=to_delete).delete()
+
+    def add_recipe(self, user_id: int, recipe: Recipe) -> None:
+        """Учитывает рецепт, добавленный в список покупок."""
+        self.apply_delta([user_id], self.recipe_amounts(recipe))
+
+    def remove_recipe(self, user_id: int, recipe: Recipe) -> None:
+        """Учитывает рецепт, удалённый из списка покупок."""
+        self.change_recipe(recipe, self.recipe_amounts(recipe), {}, [user_id])
+
+    def add_recipes(self, user_id: int, recipe_ids: list[int]) -> None:
+        """Учитывает несколько рецептов, добавленных в список покупок."""
+        self.apply_delta([user_id], self.recipes_amounts(recipe_ids))
+
+    def remove_recipes(self, user_id: int, recipe_ids: list[int]) -> None:
+        """Учитывает несколько рецептов, удалённых из списка покупок."""
+        self.apply_delta(
+            [user_id],
+            {
+                pk: -amount
+                for pk, amount in self.recipes_amounts(recipe_ids).items()
+            },
+        )
+
+    def discard_recipe(self, recipe: Recipe) -> None:
+        """Убирает удаляемый рецепт из списков покупок."""
+        self.change_recipe(recipe, self.recipe_amounts(recipe), {})
+
+    def change_recipe(
+        self,
+        recipe: Recipe,
+        old_amounts: dict[int, int],
+        new_amounts: dict[int, int] | None = None,
+        user_ids: list[int] | None = None,
+    ) -> None:
+        """Учитывает изменение ингредиентов рецепта у всех пользователей,
+           добавивших его в список покупок."""
+        if new_amounts is None:
+            new_amounts = self.recipe_amounts(recipe)
+        if user_ids is None:
+            user_ids = self.cart_user_ids(recipe)
+
+        delta = {
+            pk: new_amounts.get(pk, 0) - old_amounts.get(pk, 0)
+            for pk in new_amounts.keys() | old_amounts.keys()
+        }
+        self.apply_delta(user_ids, delta)
+
+    def live_totals(self, user_ids: list[int] | None = None) -> QuerySet:
+        """Суммы ингредиентов, посчитанные по корзинам."""
+        if user_ids is None:
+            carts = AmountIngredient.objects.filter(
+                recipe__in_carts__isnull=False)
+        else:
+            carts = AmountIngredient.objects.filter(
+                recipe__in_carts__user_id__in=user_ids)
+
+        return carts.values(
+            "ingredients_id", user_id=F("recipe__in_carts__user_id")
+        ).annotate(total_amount=Sum("amount"))
+
+
+class ShoppingListItem(models.Model):
+    """Сводный список покупок пользователя, поддерживаемый при
+       изменении корзины и состава рецептов."""
+    user = models.ForeignKey(
+        User,
+        verbose_name="Владелец списка",
+        related_name="shopping_list",
+        on_delete=models.CASCADE,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name="Ингредиент",
+        related_name="shopping_list_items",
+        on_delete=models.CASCADE,
+    )
+    total_amount = models.PositiveIntegerField("Общее количество", default=0)
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        verbose_name = "Позиция списка покупок"
+        verbose_name_plural = "Сводные списки покупок"
+        constraints = (
+            models.UniqueConstraint(
+                fields=("user", "ingredient"),
+                name="%(app_label)s_%(class)s_unique_ingredient"),
+        )
+
+    def __str__(self) -> str:
+        return f"{self.user}: {self.total_amount} {self.ingredient}"
+
+
+class RecipeNeighbors(models.Model):
+    """Похожие рецепты, посчитанные заранее командой
+       build_recommendations: идентификаторы и косинусная близость по
+       убыванию. stale отмечает рецепт, состав или теги которого
+       изменились после расчёта."""
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name="Рецепт",
+        related_name="neighbors",
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    neighbor_ids = models.JSONField("Похожие рецепты", default=list)
+    scores = models.JSONField("Близость", default=list)
+    stale = models.BooleanField("Требует пересчёта", default=False)
+    updated = models.DateTimeField("Пересчитано", auto_now=True)
+
+    class Meta:
+        verbose_name = "Похожие рецепты"
+        verbose_name_plural = "Похожие рецепты"
+        indexes = (
+            models.Index(
+                fields=("recipe",),
+                condition=Q(stale=True),
+                name="%(app_label)s_%(class)s_stale",
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f"{self.recipe}: {len(self.neighbor_ids)}"
@@ -0,0 +1,128 @@
+from django.core.cache import cache
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TransactionTestCase
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+
+from core.images import _process_in_worker
+from recipes.models import Recipe, ShoppingListItem
+from users.models import NewUser
+
+
+class UpgradeMigrationTest(TransactionTestCase):
+    """Данные базы, созданной до миграций recipes 0004 и users 0002,
+       после обновления."""
+
+    migrate_from = [("recipes", "0003_recipetag"), ("users", "0001_initial")]
+
+    def setUp(self) -> None:
+        executor = MigrationExecutor(connection)
+        self.migrate_to = executor.loader.graph.leaf_nodes()
+        executor.migrate(self.migrate_from)
+        self.seed(executor.loader.project_state(self.migrate_from).apps)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        cache.clear()
+
+    def tearDown(self) -> None:
+        MigrationExecutor(connection).migrate(self.migrate_to)
+
+    def seed(self, apps) -> None:
+        User = apps.get_model("users", "NewUser")
+        Ingredient = apps.get_model("recipes", "Ingredient")
+        Recipe = apps.get_model("recipes", "Recipe")
+        AmountIngredient = apps.get_model("recipes", "AmountIngredient")
+        Carts = apps.get_model("recipes", "Carts")
+        Favorites = apps.get_model("recipes", "Favorites")
+        Subscriptions = apps.get_model("users", "Subscriptions")
+
+        author, reader = (
+            User.objects.create(
+                username=name, email=f"{name}@example.com",
+                first_name=name, last_name=name,
+            )
+            for name in ("author", "reader")
+        )
+        salt, flour = (
+            Ingredient.objects.create(name=name, measurement_unit="г")
+            for name in ("соль", "мука")
+        )
+        recipes = [
+            Recipe.objects.create(
+                author=author, name=f"Рецепт {i}", text="Описание",
+                cooking_time=10, image="recipes/images/recipe.png",
+            )
+            for i in range(2)
+        ]
+        AmountIngredient.objects.bulk_create(
+            [
+                AmountIngredient(
+                    recipe=recipes[0], ingredients=salt, amount=5),
+                AmountIngredient(
+                    recipe=recipes[0], ingredients=flour, amount=100),
+                AmountIngredient(
+                    recipe=recipes[1], ingredients=salt, amount=2),
+            ]
+        )
+        Carts.objects.bulk_create(
+            Carts(user=reader, recipe=recipe) for recipe in recipes)
+        Favorites.objects.bulk_create(
+            Favorites(user=user, recipe=recipes[0])
+            for user in (author, reader)
+        )
+        Subscriptions.objects.create(user=reader, author=author)
+
+    def test_shopping_lists_are_filled(self) -> None:
+        reader = NewUser.objects.get(username="reader")
+        self.assertEqual(
+            dict(
+                reader.shopping_list.values_list(
+                    "ingredient__name", "total_amount")
+            ),
+            {"соль": 7, "мука": 100},
+        )
+
+        client = APIClient()
+        client.force_authenticate(reader)
+        response = client.get("/api/recipes/download_shopping_cart/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("соль", b"".join(response.streaming_content).decode())
+        self.assertFalse(
+            ShoppingListItem.objects.exclude(user=reader).exists())
+
+    def test_counters_are_filled(self) -> None:
+        author = NewUser.objects.get(username="author")
+        self.assertEqual(
+            (author.recipes_count, author.subscribers_count), (2, 1))
+        self.assertEqual(
+            list(
+                Recipe.objects.order_by("name").values_list(
+                    "favorites_count", "carts_count")
+            ),
+            [(2, 1), (0, 1)],
+        )
+
+        client = APIClient()
+        client.force_authenticate(NewUser.objects.get(username="reader"))
+        response = client.get("/api/users/subscriptions/?limit=10")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["recipes_count"], 2)
+
+
+class ImagePipelineTest(SimpleTestCase):
+
+    def test_worker_failure_is_logged_and_counted(self) -> None:
+        def failures() -> float:
+            return REGISTRY.get_sample_value(
+                "foodgram_image_rendition_failures_total") or 0
+
+        before = failures()
+        with self.assertLogs("foodgram.images", "ERROR") as logs:
+            _process_in_worker(1, "recipes/images/missing.png")
+
+        self.assertIn("missing.png", logs.output[0])
+        self.assertEqual(failures(), before + 1)
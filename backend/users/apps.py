@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self) -> None:
+        from django.db.models.signals import (post_delete, post_save,
+                                              pre_delete)
+        from rest_framework.authtoken.models import Token
+
+        from core.auth import token_deleted, user_changed
+        from core.counters import discount_user_relations
+
+        user = self.get_model("NewUser")
+        post_save.connect(user_changed, sender=user)
+        pre_delete.connect(discount_user_relations, sender=user)
+        post_delete.connect(token_deleted, sender=Token)
@@ -1,7 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db.models import (CASCADE, BooleanField, CharField,
                               CheckConstraint, DateTimeField, EmailField, F,
-                              ForeignKey, Model, Q, UniqueConstraint)
+                              ForeignKey, Index, Model, PositiveIntegerField,
+                              Q, UniqueConstraint)
 from django.db.models.functions import Length
 from django.utils.translation import gettext_lazy as _
 
@@ -66,6 +67,16 @@ class NewUser(AbstractUser, NormalizeValidators):
         verbose_name="Активирован",
         default=True,
     )
+    recipes_count = PositiveIntegerField(
+        verbose_name="Рецептов",
+        default=0,
+        editable=False,
+    )
+    subscribers_count = PositiveIntegerField(
+        verbose_name="Подписчиков",
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = "Пользователь"
@@ -114,6 +125,13 @@ class Subscriptions(Model):
                 check=~Q(author=F("user")), name="\nNo self sibscription\n"
             ),
         )
+        indexes = (
+            Index(
+                fields=("user", "-date_added"),
+                include=("author",),
+                name="users_subscriptions_user_date",
+            ),
+        )
 
     def __str__(self) -> str:
         return f"{self.user.username} -> {self.author.username}"